@@ -1,8 +1,6 @@
 import os
 from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
-from flask_openid import OpenID
 from config import basedir
 """
 This web application is a small CMS. Main features are
@@ -28,14 +26,16 @@ This web application is a small CMS. Main features are
 app = Flask(__name__)
 
 app.config.from_object('config')
-db = SQLAlchemy(app)
+from app.routing import RoutingSQLAlchemy
+db = RoutingSQLAlchemy(app)
+from app.templating import init_templates
+init_templates(app)
 
 
 lm = LoginManager()
 lm.init_app(app)
 lm.login_view = 'login'
-oid = OpenID(app, os.path.join(basedir, 'tmp'))
+from app.lazy import LazyOpenID
+oid = LazyOpenID(app, os.path.join(basedir, 'tmp'))
 
 from app import views, models
-
-app.run()
@@ -0,0 +1,7 @@
+from app.wsgi import application
+
+"""
+Runs the application with development server: python -m app
+"""
+
+application.run()
@@ -0,0 +1,76 @@
+import threading
+import time
+from app import app
+
+"""
+Contains admission control of database writers.
+When many submissions arrive at once, only a few of them write to the database at the same time, a bounded number
+waits in the queue and the rest is refused immediately (503 Service Unavailable with Retry-After), so request
+threads don't pile up behind the database write lock and pages can still be served.
+"""
+
+
+class AdmissionGate(object):
+    """
+    Class representing gate that lets at most `capacity` requests in at once.
+    Up to `queue_depth` other requests wait (at most `timeout` seconds) for a free place, the rest is shed.
+    Contains counters exported as metrics: active, waiting, admitted, shed.
+    """
+
+    def __init__(self, name, capacity, queue_depth, timeout):
+        self.name = name
+        self.capacity = capacity
+        self.queue_depth = queue_depth
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """
+        Method tries to let a request in.
+        :return: True if request was admitted (release() has to be called afterwards), False if it was shed
+        """
+        with self._condition:
+            if self.active >= self.capacity:
+                if self.waiting >= self.queue_depth:
+                    self.shed += 1
+                    return False
+                self.waiting += 1
+                deadline = time.time() + self.timeout
+                try:
+                    while self.active >= self.capacity:
+                        remaining = deadline - time.time()
+                        if remaining <= 0:
+                            self.shed += 1
+                            return False
+                        self._condition.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.active += 1
+            self.admitted += 1
+            return True
+
+    def release(self):
+        with self._condition:
+            self.active -= 1
+            self._condition.notify()
+
+    def metrics(self):
+        """
+        Method returns state of the gate in Prometheus text format.
+        :return: list of strings
+        """
+        return ['%s{gate="%s"} %d' % (metric, self.name, value)
+                for metric, value in (('admission_active', self.active),
+                                      ('admission_queue_depth', self.waiting),
+                                      ('admission_admitted_total', self.admitted),
+                                      ('admission_shed_total', self.shed))]
+
+
+write_gate = AdmissionGate('write',
+                           app.config['DB_WRITERS'],
+                           app.config['DB_WRITE_QUEUE_DEPTH'],
+                           app.config['DB_WRITE_QUEUE_TIMEOUT'])
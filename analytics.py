@@ -0,0 +1,157 @@
+import datetime
+import numpy as np
+from app import db
+from .models import QuizQuestion, QuizAnswerOption, QuizSubmission, QuizAnswerTally
+
+"""
+Contains cross-tab analytics of quiz answers.
+Submissions of a quiz are loaded into a NumPy matrix - one row per respondent, one integer column per question
+(index of the chosen answer option, or -1 if question wasn't answered) - and every statistic is computed with
+vectorized operations over whole columns.
+"""
+
+NOT_ANSWERED = -1
+
+
+class Responses(object):
+    """
+    Class representing answers of all respondents of a quiz in columnar form.
+    Contains fields:
+        - questions - list of QuizQuestions, in order of columns
+        - options - list of lists of QuizAnswerOptions, options[column][index] is the option coded as index
+        - matrix - numpy array (respondents x questions) of option indexes
+        - since - time of the oldest submission if older ones were removed by compaction (they can't be analysed),
+          None if all submissions are included
+    """
+
+    def __init__(self, questions, options, matrix, since=None):
+        self.questions = questions
+        self.options = options
+        self.matrix = matrix
+        self.since = since
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def column(self, question_id):
+        """
+        Method returns position of question in the matrix.
+        :param question_id: ID of quiz question
+        :return: integer
+        """
+        for position, question in enumerate(self.questions):
+            if question.id == question_id:
+                return position
+        raise KeyError(question_id)
+
+    def where(self, question_id, option_id):
+        """
+        Method returns responses of respondents who chose given answer option.
+        e.g. responses.where(1, 3) --> "people who answered option 3 on question 1"
+        :param question_id: ID of quiz question
+        :param option_id: ID of quiz answer option
+        :return: Responses
+        """
+        position = self.column(question_id)
+        index = [option.id for option in self.options[position]].index(option_id)
+        return Responses(self.questions, self.options, self.matrix[self.matrix[:, position] == index], self.since)
+
+    def distribution(self, question_id):
+        """
+        Method returns how many respondents chose each answer option of a question.
+        :param question_id: ID of quiz question
+        :return: numpy array of counts, in order of options
+        """
+        position = self.column(question_id)
+        answered = self.matrix[:, position]
+        answered = answered[answered != NOT_ANSWERED]
+        return np.bincount(answered, minlength=len(self.options[position]))
+
+    def contingency(self, row_question_id, column_question_id):
+        """
+        Method returns contingency table of two questions - how many respondents chose each pair of options.
+        Respondents that didn't answer any of the two questions are skipped.
+        :param row_question_id: ID of quiz question in rows
+        :param column_question_id: ID of quiz question in columns
+        :return: numpy array (row options x column options)
+        """
+        row_position = self.column(row_question_id)
+        column_position = self.column(column_question_id)
+        rows = self.matrix[:, row_position].astype(np.int64)
+        columns = self.matrix[:, column_position].astype(np.int64)
+        answered = (rows != NOT_ANSWERED) & (columns != NOT_ANSWERED)
+        height = len(self.options[row_position])
+        width = len(self.options[column_position])
+        cells = np.bincount(rows[answered] * width + columns[answered], minlength=height * width)
+        return cells.reshape(height, width)
+
+
+def load_responses(quiz):
+    """
+    Function loads all submissions of a quiz into Responses.
+    Packed option arrays are read without creating ORM objects, concatenated and decoded by numpy at once,
+    then every option ID is translated to its (column, index) through lookup arrays.
+    Submissions already removed by compaction are not included, Responses.since tells which period is covered then.
+    :param quiz: Quiz
+    :return: Responses
+    """
+    questions = quiz.questions.order_by(QuizQuestion.id).all()
+    options = [question.answers.order_by(QuizAnswerOption.id).all() for question in questions]
+    table = QuizSubmission.__table__
+    blobs = [row[0] for row in
+             db.session.execute(db.select([table.c.option_ids]).where(table.c.quiz_id == quiz.id))]
+    since = None
+    if db.session.query(QuizAnswerTally.id).filter(QuizAnswerTally.quiz_id == quiz.id).first() is not None:
+        since = db.session.query(db.func.min(QuizSubmission.created_at)) \
+            .filter(QuizSubmission.quiz_id == quiz.id).scalar() or datetime.datetime.utcnow()
+
+    matrix = np.full((len(blobs), len(questions)), NOT_ANSWERED, dtype=np.int16)
+    ids = np.frombuffer(b''.join(blobs), dtype='<u4').astype(np.int64)
+    if not ids.size or not questions:
+        return Responses(questions, options, matrix, since)
+
+    lengths = np.fromiter((len(blob) // 4 for blob in blobs), dtype=np.int64, count=len(blobs))
+    respondents = np.repeat(np.arange(len(blobs)), lengths)
+
+    size = max(max(option.id for column in options for option in column) if any(options) else 0,
+               int(ids.max())) + 1
+    column_of = np.full(size, NOT_ANSWERED, dtype=np.int64)
+    index_of = np.full(size, NOT_ANSWERED, dtype=np.int16)
+    for position, column in enumerate(options):
+        for index, option in enumerate(column):
+            column_of[option.id] = position
+            index_of[option.id] = index
+
+    # Options deleted after the vote have no column and are skipped.
+    known = column_of[ids] != NOT_ANSWERED
+    matrix[respondents[known], column_of[ids[known]]] = index_of[ids[known]]
+    return Responses(questions, options, matrix, since)
+
+
+def conditional_distribution(table):
+    """
+    Function returns contingency table normalized by rows - distribution of column answers given row answer.
+    Rows without any respondent contain zeros.
+    :param table: numpy array returned by Responses.contingency()
+    :return: numpy array of floats
+    """
+    totals = table.sum(axis=1, keepdims=True)
+    return np.divide(table, totals, out=np.zeros(table.shape), where=totals > 0)
+
+
+def chi_square(table):
+    """
+    Function computes Pearson's chi-square test of independence of a contingency table.
+    Options nobody chose are left out, so they don't produce empty expected cells.
+    :param table: numpy array returned by Responses.contingency()
+    :return: tuple (chi-square statistic, degrees of freedom, Cramer's V)
+    """
+    table = table[table.sum(axis=1) > 0][:, table.sum(axis=0) > 0].astype(np.float64)
+    total = table.sum()
+    if total == 0 or min(table.shape) < 2:
+        return 0.0, 0, 0.0
+    expected = np.outer(table.sum(axis=1), table.sum(axis=0)) / total
+    statistic = float(((table - expected) ** 2 / expected).sum())
+    degrees_of_freedom = (table.shape[0] - 1) * (table.shape[1] - 1)
+    cramers_v = float(np.sqrt(statistic / (total * (min(table.shape) - 1))))
+    return statistic, degrees_of_freedom, cramers_v
@@ -0,0 +1,126 @@
+from sqlalchemy.orm.interfaces import ONETOMANY
+from app import db
+from .content_version import content_changed
+from .lazy import lazy_import
+from .models import Menu, Page, Submenu, Quiz, QuizQuestion, QuizAnswerOption, delete_votes
+from .quiz_schema import invalidate_quiz_schemas
+
+"""
+Contains bulk actions of admin panel - delete, move or edit a field of many selected rows at once.
+Every action is one set-based UPDATE / DELETE statement (plus one per child table on delete) in one transaction.
+"""
+
+forms = lazy_import('app.forms')
+
+
+def _text(max_length):
+    def convert(value):
+        if not value or len(value) > max_length:
+            raise ValueError('Value has to have from 1 to %d characters.' % max_length)
+        return value
+    return convert
+
+
+def _number(minimum, maximum):
+    def convert(value):
+        number = int(value)
+        if not minimum <= number <= maximum:
+            raise ValueError('Value has to be a number from %d to %d.' % (minimum, maximum))
+        return number
+    return convert
+
+
+# Entities of admin panel:
+#     - model, type of content (see ContentVersion), view of the admin page
+#     - move - (foreign key column, model it refers to, function returning (ID, caption) of rows rows can be moved to)
+#       or None
+#     - fields - {field: function converting (and validating) submitted value}
+BULK_ENTITIES = {
+    'menu': {'model': Menu, 'content': 'menu', 'view': 'add_menu',
+             'move': None,
+             'fields': {'type': _number(0, 1), 'link': _text(50)}},
+    'submenu': {'model': Submenu, 'content': 'menu', 'view': 'add_submenu',
+                'move': ('section_id', Menu, lambda: db.session.query(Menu.id, Menu.caption)
+                         .filter_by(type=1).order_by(Menu.sequence).all()),
+                'fields': {'sequence': _number(-2 ** 31, 2 ** 31 - 1), 'link': _text(50)}},
+    'page': {'model': Page, 'content': 'page', 'view': 'add_page',
+             'move': None,
+             'fields': {'img_name': _text(50)}},
+    'quiz': {'model': Quiz, 'content': 'quiz', 'view': 'add_quiz',
+             'move': None,
+             'fields': {'counter_stripes': _number(1, 64)}},
+    'quiz_question': {'model': QuizQuestion, 'content': 'quiz', 'view': 'add_quiz_question',
+                      'move': ('quiz_id', Quiz, lambda: db.session.query(Quiz.id, Quiz.name).all()),
+                      'fields': {}},
+    'quiz_answer_option': {'model': QuizAnswerOption, 'content': 'quiz', 'view': 'add_quiz_answer_option',
+                           'move': ('quiz_question_id', QuizQuestion,
+                                    lambda: db.session.query(QuizQuestion.id, QuizQuestion.question).all()),
+                           'fields': {}},
+}
+
+
+def bulk_context(entity):
+    """
+    Function prepares variables of bulk_actions.html template of an entity.
+    :param entity: key of BULK_ENTITIES
+    :return: dict
+    """
+    spec = BULK_ENTITIES[entity]
+    return {'entity': entity,
+            'form': forms.BulkActionForm(),
+            'targets': spec['move'][2]() if spec['move'] else [],
+            'fields': sorted(spec['fields'])}
+
+
+def _delete(model, ids):
+    if model in (Quiz, QuizQuestion, QuizAnswerOption):
+        delete_votes(model, ids)
+    # Like session.delete() of every row: children lose the reference instead of keeping a dangling ID.
+    for relationship in model.__mapper__.relationships:
+        if relationship.direction is ONETOMANY:
+            for column in relationship.remote_side:
+                db.session.query(relationship.mapper.class_) \
+                    .filter(column.in_(ids)) \
+                    .update({column.key: None}, synchronize_session=False)
+    return db.session.query(model).filter(model.id.in_(ids)).delete(synchronize_session=False)
+
+
+def bulk_action(entity, ids, action, target=None, field=None, value=None):
+    """
+    Function runs bulk action on rows of an entity.
+    :param entity: key of BULK_ENTITIES
+    :param ids: list of IDs of rows
+    :param action: 'delete', 'move' (to row with ID target) or 'set' (field to value)
+    :param target: ID of row rows are moved to
+    :param field: name of field to set
+    :param value: submitted value of field
+    :return: amount of changed rows
+    :raise ValueError: if action or its parameters are invalid
+    """
+    spec = BULK_ENTITIES[entity]
+    model = spec['model']
+    ids = [int(row_id) for row_id in ids]
+    if not ids:
+        raise ValueError('Select at least one row.')
+    db.session.use_primary()
+    query = db.session.query(model).filter(model.id.in_(ids))
+    try:
+        if action == 'delete':
+            changed = _delete(model, ids)
+        elif action == 'move' and spec['move']:
+            column, parent = spec['move'][:2]
+            if target is None or db.session.query(parent.id).filter(parent.id == target).first() is None:
+                raise ValueError('There is no element with such ID.')
+            changed = query.update({column: target}, synchronize_session=False)
+        elif action == 'set' and field in spec['fields']:
+            changed = query.update({field: spec['fields'][field](value)}, synchronize_session=False)
+        else:
+            raise ValueError('Unknown action.')
+        content_changed(spec['content'])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    if spec['content'] == 'quiz':
+        invalidate_quiz_schemas()
+    return changed
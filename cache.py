@@ -0,0 +1,384 @@
+import fcntl
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from app import app
+
+"""
+Contains cache of an application, kept in memory of a process (LocalCache) or in a memory-mapped file shared
+by all processes on the host (SharedMemoryCache), chosen with CACHE_BACKEND.
+Keys are strings in form 'namespace:key' (e.g. 'quiz_schema:5'), so all entries of one kind of content can be
+dropped at once with delete_namespace() when the content is edited in admin panel.
+"""
+
+
+class LocalCache(object):
+    """
+    Class representing cache kept in memory of a single process.
+    Every entry may have its own timeout (in seconds), entries without timeout live until deleted.
+    Values are stored as they are - keep in cache only plain data (not ORM objects bound to a session).
+    """
+
+    # Entries are lost when the process ends
+    persistent = False
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        Method returns value stored under key, or default if there's no such (or expired) entry.
+        :param key: string
+        :param default: value returned on cache miss
+        :return: cached value
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        value, expires = entry
+        if expires is not None and expires < time.time():
+            self._entries.pop(key, None)
+            return default
+        return value
+
+    def set(self, key, value, timeout=None):
+        """
+        Method stores value under key.
+        :param key: string
+        :param value: cached value
+        :param timeout: seconds after which entry expires, None means never
+        """
+        expires = time.time() + timeout if timeout is not None else None
+        self._entries[key] = (value, expires)
+
+    def delete(self, key):
+        self._entries.pop(key, None)
+
+    def delete_namespace(self, namespace):
+        """
+        Method removes all entries which keys start with 'namespace:'.
+        :param namespace: string
+        """
+        prefix = namespace + ':'
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                self._entries.pop(key, None)
+
+    def items(self, namespaces):
+        """
+        Method returns all live entries of namespaces.
+        :param namespaces: list of namespaces
+        :return: list of tuples (key, value, expiration time or None)
+        """
+        prefixes = tuple(namespace + ':' for namespace in namespaces)
+        now = time.time()
+        return [(key, value, expires) for key, (value, expires) in list(self._entries.items())
+                if key.startswith(prefixes) and (expires is None or expires > now)]
+
+    def clear(self):
+        self._entries.clear()
+
+
+# Layout of the SharedMemoryCache file: header, index of slots, data area.
+# Header: magic, amount of slots, size of data area, write position in data area (grows forever, wraps modulo size).
+HEADER = struct.Struct('<8sQQQ')
+WRITE_POSITION = 24
+MAGIC = b'CMSCACH1'
+# Slot: seqlock counter, then body - length of entry (0 means empty slot), hash of key, write position of entry,
+# expiration time (0 means never), time of last use.
+SEQUENCE = struct.Struct('<I')
+SLOT_BODY = struct.Struct('<IQQdd')
+SLOT_SIZE = SEQUENCE.size + SLOT_BODY.size
+LAST_USE = SLOT_SIZE - 8
+POSITION = struct.Struct('<Q')
+TIMESTAMP = struct.Struct('<d')
+# Entry: length of key, key, pickled value.
+KEY_LENGTH = struct.Struct('<H')
+PROBES = 8
+READ_RETRIES = 16
+
+
+class SharedMemoryCache(object):
+    """
+    Class representing cache stored in a memory-mapped file, shared by all processes which open the same file.
+    Key is looked up in PROBES consecutive slots of fixed-size hash index starting at its hash. Entries are appended
+    to the data area used as a ring buffer - entry is gone when the ring wraps over it. When all slots of a key are
+    taken, the least recently used one is replaced.
+    Readers take no lock: every slot has a seqlock counter, odd while the slot is being written, and changed after
+    every write, so a reader which saw it change (or saw its entry overwritten in the ring) just retries.
+    Writers are serialized with a lock on the file (flock) and a thread lock.
+    Values are pickled - keep in cache only plain data (not ORM objects bound to a session).
+    """
+
+    # Entries stay in the file when all processes end
+    persistent = True
+
+    def __init__(self, path, size, slots):
+        self.path = path
+        self.data_size = size
+        self.slots = slots
+        self._data_start = HEADER.size + slots * SLOT_SIZE
+        self._lock = threading.Lock()
+        self._pid = None
+        self._fd = None
+        self._map = None
+
+    def _mapping(self):
+        # File is opened in every process separately - flock doesn't exclude processes sharing a descriptor.
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._open()
+        return self._map
+
+    def _open(self):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        length = self._data_start + self.data_size
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            header = os.pread(fd, HEADER.size, 0)
+            if os.fstat(fd).st_size != length or len(header) != HEADER.size or \
+                    HEADER.unpack(header)[:3] != (MAGIC, self.slots, self.data_size):
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, length)
+                os.pwrite(fd, HEADER.pack(MAGIC, self.slots, self.data_size, 0), 0)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        self._map = mmap.mmap(fd, length)
+        self._fd = fd
+        self._pid = os.getpid()
+
+    @contextmanager
+    def _writing(self):
+        mapping = self._mapping()
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield mapping
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _probe(self, key_hash):
+        return [HEADER.size + (key_hash + i) % self.slots * SLOT_SIZE for i in range(PROBES)]
+
+    def _live(self, mapping, position):
+        return POSITION.unpack_from(mapping, WRITE_POSITION)[0] <= position + self.data_size
+
+    def _entry(self, mapping, position, length):
+        start = self._data_start + position % self.data_size
+        entry = mapping[start:start + length]
+        key_length = KEY_LENGTH.unpack_from(entry)[0]
+        return entry[KEY_LENGTH.size:KEY_LENGTH.size + key_length], entry[KEY_LENGTH.size + key_length:]
+
+    def _read(self, mapping, slot, key_hash):
+        """
+        Method reads entry of a slot without lock.
+        :return: tuple (key, pickled value, expiration time), None if slot holds no live entry with such hash
+        """
+        for _ in range(READ_RETRIES):
+            sequence = SEQUENCE.unpack_from(mapping, slot)[0]
+            if sequence & 1:
+                continue
+            length, entry_hash, position, expires, used = SLOT_BODY.unpack_from(mapping, slot + SEQUENCE.size)
+            if length == 0 or entry_hash != key_hash:
+                return None
+            try:
+                key, value = self._entry(mapping, position, length)
+            except struct.error:
+                continue
+            if SEQUENCE.unpack_from(mapping, slot)[0] != sequence:
+                continue
+            if not self._live(mapping, position):
+                return None
+            return key, value, expires
+        return None
+
+    def _write_slot(self, mapping, slot, length=0, key_hash=0, position=0, expires=0):
+        sequence = SEQUENCE.unpack_from(mapping, slot)[0]
+        SEQUENCE.pack_into(mapping, slot, (sequence + 1) & 0xffffffff)
+        SLOT_BODY.pack_into(mapping, slot + SEQUENCE.size, length, key_hash, position, expires, time.time())
+        SEQUENCE.pack_into(mapping, slot, (sequence + 2) & 0xffffffff)
+
+    def get(self, key, default=None):
+        """
+        Method returns value stored under key, or default if there's no such (or expired) entry.
+        :param key: string
+        :param default: value returned on cache miss
+        :return: cached value
+        """
+        mapping = self._mapping()
+        key = key.encode('utf-8')
+        key_hash = _hash(key)
+        for slot in self._probe(key_hash):
+            entry = self._read(mapping, slot, key_hash)
+            if entry is None or entry[0] != key:
+                continue
+            if entry[2] and entry[2] < time.time():
+                return default
+            TIMESTAMP.pack_into(mapping, slot + LAST_USE, time.time())
+            return pickle.loads(entry[1])
+        return default
+
+    def set(self, key, value, timeout=None):
+        """
+        Method stores value under key. Values bigger than 1/8 of the data area are not stored.
+        :param key: string
+        :param value: cached value
+        :param timeout: seconds after which entry expires, None means never
+        """
+        key = key.encode('utf-8')
+        entry = KEY_LENGTH.pack(len(key)) + key + pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(entry) > self.data_size // 8:
+            return
+        key_hash = _hash(key)
+        expires = time.time() + timeout if timeout is not None else 0
+        with self._writing() as mapping:
+            slot = self._find(mapping, key, key_hash) or self._victim(mapping, key_hash)
+            position = POSITION.unpack_from(mapping, WRITE_POSITION)[0]
+            if position % self.data_size + len(entry) > self.data_size:
+                # Entry never wraps around the end of the data area.
+                position += self.data_size - position % self.data_size
+            POSITION.pack_into(mapping, WRITE_POSITION, position + len(entry))
+            start = self._data_start + position % self.data_size
+            mapping[start:start + len(entry)] = entry
+            self._write_slot(mapping, slot, len(entry), key_hash, position, expires)
+
+    def _find(self, mapping, key, key_hash):
+        for slot in self._probe(key_hash):
+            entry = self._read(mapping, slot, key_hash)
+            if entry is not None and entry[0] == key:
+                return slot
+        return None
+
+    def _victim(self, mapping, key_hash):
+        victim, victim_used = None, None
+        now = time.time()
+        for slot in self._probe(key_hash):
+            length, entry_hash, position, expires, used = SLOT_BODY.unpack_from(mapping, slot + SEQUENCE.size)
+            if length == 0 or not self._live(mapping, position) or (expires and expires < now):
+                return slot
+            if victim is None or used < victim_used:
+                victim, victim_used = slot, used
+        return victim
+
+    def delete(self, key):
+        key = key.encode('utf-8')
+        key_hash = _hash(key)
+        with self._writing() as mapping:
+            slot = self._find(mapping, key, key_hash)
+            if slot is not None:
+                self._write_slot(mapping, slot)
+
+    def delete_namespace(self, namespace):
+        """
+        Method removes all entries which keys start with 'namespace:'.
+        :param namespace: string
+        """
+        prefix = (namespace + ':').encode('utf-8')
+        with self._writing() as mapping:
+            for slot in range(HEADER.size, self._data_start, SLOT_SIZE):
+                length, entry_hash, position, expires, used = SLOT_BODY.unpack_from(mapping, slot + SEQUENCE.size)
+                if length and self._live(mapping, position) and \
+                        self._entry(mapping, position, length)[0].startswith(prefix):
+                    self._write_slot(mapping, slot)
+
+    def clear(self):
+        with self._writing() as mapping:
+            for slot in range(HEADER.size, self._data_start, SLOT_SIZE):
+                if SLOT_BODY.unpack_from(mapping, slot + SEQUENCE.size)[0]:
+                    self._write_slot(mapping, slot)
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little')
+
+
+if app.config['CACHE_BACKEND'] == 'shared':
+    cache = SharedMemoryCache(app.config['CACHE_FILE'], app.config['CACHE_SIZE'], app.config['CACHE_SLOTS'])
+else:
+    cache = LocalCache()
+
+
+class SingleFlight(object):
+    """
+    Class representing coalescing of concurrent computations of the same key within a process.
+    The first caller of do() for a key computes the value, callers which come while it's computed wait for
+    its result (or its exception) instead of computing it again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def running(self, key):
+        return key in self._flights
+
+    def do(self, key, function):
+        """
+        Method returns result of function, computed once for all concurrent callers with the same key.
+        :param key: string
+        :param function: function without parameters
+        :return: result of function
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = {'done': threading.Event()}
+        if not leader:
+            flight['done'].wait()
+            if 'error' in flight:
+                raise flight['error']
+            return flight['value']
+        try:
+            flight['value'] = function()
+            return flight['value']
+        except Exception as error:
+            flight['error'] = error
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight['done'].set()
+
+
+flights = SingleFlight()
+
+
+def get_or_set(key, loader, timeout=None, stale=0):
+    """
+    Function returns value cached under key, on cache miss the value is computed by loader and cached.
+    Only one loader per key runs in a process at once, concurrent callers wait for its result.
+    Entry is fresh for `timeout` seconds and then kept `stale` seconds more: while one caller computes a new value
+    for a stale entry, the others get the stale value right away (stale-while-revalidate).
+    Entries are stored with their freshness, so keys used here have to be read only with this function.
+    None returned by loader is not cached (misses of e.g. not existing pages would fill the cache).
+    :param key: string
+    :param loader: function without parameters returning value to cache
+    :param timeout: seconds after which value has to be computed again, None means never
+    :param stale: seconds after timeout during which stale value may be returned
+    :return: cached value
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        value, fresh_until = entry
+        if fresh_until is None or fresh_until > time.time() or flights.running(key):
+            return value
+
+    def load():
+        value = loader()
+        if value is None:
+            return None
+        if timeout is None:
+            cache.set(key, (value, None))
+        else:
+            cache.set(key, (value, time.time() + timeout), timeout + stale)
+        return value
+
+    return flights.do(key, load)
@@ -0,0 +1,144 @@
+import datetime
+from collections import Counter
+from contextlib import contextmanager
+from sqlalchemy import select, and_, text, bindparam, DateTime
+from app import app, db
+from .models import QuizSubmission, QuizVoteBucket
+
+"""
+Contains retention and compaction of quiz submissions.
+Old submissions are folded into QuizAnswerTally, copied to the archive database (SQLite file ATTACHed for the time
+of compaction) and deleted from the main database in chunks - every chunk is a separate short transaction,
+so voting is blocked only for a moment. Main database file stays small enough to fit in page cache.
+Stripes of closed vote buckets are folded here as well (see fold_vote_stripes()).
+"""
+
+
+def fold_into_tallies(connection, rows):
+    """
+    Function adds votes of given submissions to QuizAnswerTally.
+    Votes are counted per answer option and upserted with one statement for the whole chunk (needs SQLite 3.24+).
+    :param connection: SQLAlchemy connection with open transaction
+    :param rows: rows of quiz_submission table
+    """
+    counts = Counter()
+    quiz_of_option = {}
+    for row in rows:
+        for option_id in QuizSubmission.unpack_options(row.option_ids):
+            counts[option_id] += 1
+            quiz_of_option[option_id] = row.quiz_id
+    if not counts:
+        return
+    connection.execute(text('INSERT INTO quiz_answer_tally (quiz_id, quiz_answer_option_id, votes) '
+                            'VALUES (:quiz_id, :quiz_answer_option_id, :votes) '
+                            'ON CONFLICT (quiz_answer_option_id) '
+                            'DO UPDATE SET votes = quiz_answer_tally.votes + EXCLUDED.votes'),
+                       [{'quiz_id': quiz_of_option[option_id],
+                         'quiz_answer_option_id': option_id,
+                         'votes': votes} for option_id, votes in counts.items()])
+
+
+def vacuum(connection, full=False):
+    """
+    Function gives space of deleted rows back to the file system.
+    If database uses auto_vacuum=INCREMENTAL (set by bootstrap of new databases), free pages are released without
+    rewriting the file. Otherwise they are only reused by new rows, unless full is True - then whole database is
+    rebuilt (VACUUM) and switched to auto_vacuum=INCREMENTAL, so later compactions release pages incrementally.
+    :param connection: SQLAlchemy connection without open transaction
+    :param full: boolean
+    """
+    if connection.dialect.name != 'sqlite':
+        return
+    if connection.execute(text('PRAGMA auto_vacuum')).scalar() == 2:
+        connection.execute(text('PRAGMA incremental_vacuum'))
+    elif full:
+        # Changed auto_vacuum mode of an existing database is applied by VACUUM.
+        connection.execute(text('PRAGMA auto_vacuum = INCREMENTAL'))
+        connection.execute(text('VACUUM'))
+
+
+@contextmanager
+def attached_archive(connection, archive):
+    """
+    Context manager attaching the archive database to the connection (if archive is set) and detaching it at the end,
+    so the pooled connection doesn't keep it attached even if compaction fails.
+    :param connection: SQLAlchemy connection without open transaction
+    :param archive: path of archive SQLite file or None
+    """
+    if not archive:
+        yield
+        return
+    if connection.dialect.name != 'sqlite':
+        raise RuntimeError('Archive database can be attached only to SQLite database.')
+    connection.execute(text('ATTACH DATABASE :path AS archive'), path=archive)
+    try:
+        connection.execute(text('CREATE TABLE IF NOT EXISTS archive.quiz_submission ('
+                                'id INTEGER PRIMARY KEY, quiz_id INTEGER, created_at DATETIME, option_ids BLOB)'))
+        yield
+    finally:
+        connection.execute(text('DETACH DATABASE archive'))
+
+
+def compact_submissions(retention_days=None, archive=None, chunk_size=None, full_vacuum=False, progress=None):
+    """
+    Function compacts submissions older than retention_days.
+    Every chunk (chunk_size oldest submissions) is processed in one transaction:
+        - votes are folded into QuizAnswerTally
+        - rows are copied to the archive database (if archive is set)
+        - rows are deleted
+    At the end free pages are released (see vacuum()).
+    Defaults are taken from SUBMISSION_RETENTION_DAYS, SUBMISSION_ARCHIVE and COMPACTION_CHUNK_SIZE.
+    :param retention_days: integer
+    :param archive: path of archive SQLite file or None
+    :param chunk_size: integer
+    :param full_vacuum: boolean, see vacuum()
+    :param progress: function called with amount of submissions compacted so far
+    :return: amount of compacted submissions
+    """
+    if retention_days is None:
+        retention_days = app.config['SUBMISSION_RETENTION_DAYS']
+    if archive is None:
+        archive = app.config['SUBMISSION_ARCHIVE']
+    chunk_size = chunk_size or app.config['COMPACTION_CHUNK_SIZE']
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=retention_days)
+    table = QuizSubmission.__table__
+    compacted = 0
+
+    connection = db.engine.connect()
+    try:
+        with attached_archive(connection, archive):
+            while True:
+                with connection.begin():
+                    rows = connection.execute(select([table])
+                                              .where(table.c.created_at < cutoff)
+                                              .order_by(table.c.id)
+                                              .limit(chunk_size)).fetchall()
+                    if not rows:
+                        break
+                    in_chunk = and_(table.c.id <= rows[-1].id, table.c.created_at < cutoff)
+                    fold_into_tallies(connection, rows)
+                    if archive:
+                        connection.execute(text('INSERT OR IGNORE INTO archive.quiz_submission '
+                                                'SELECT id, quiz_id, created_at, option_ids FROM quiz_submission '
+                                                'WHERE id <= :last_id AND created_at < :cutoff')
+                                           .bindparams(bindparam('cutoff', type_=DateTime)),
+                                           last_id=rows[-1].id, cutoff=cutoff)
+                    connection.execute(table.delete().where(in_chunk))
+                compacted += len(rows)
+                if progress is not None:
+                    progress(compacted)
+        vacuum(connection, full_vacuum)
+    finally:
+        connection.close()
+    return compacted
+
+
+def fold_vote_stripes():
+    """
+    Function folds stripes of all closed QuizVoteBuckets (see QuizVoteBucket.fold_stripes()) in one transaction.
+    :return: amount of deleted stripe rows
+    """
+    db.session.use_primary()
+    deleted = QuizVoteBucket.fold_stripes(datetime.datetime.utcnow())
+    db.session.commit()
+    return deleted
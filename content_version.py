@@ -0,0 +1,102 @@
+import threading
+import time
+from app import app, db
+from .cache import cache
+from .models import ContentVersion
+
+"""
+Contains invalidation of caches shared by all processes of an application.
+Admin panel bumps ContentVersion of edited content in the same transaction as the edit. Every process reads
+the versions at most once per CONTENT_VERSION_CHECK_INTERVAL seconds (before a request) and drops cache namespaces
+of content types which version has changed since the previous check.
+Cached content is loaded from the primary database (see load_from_primary()), so content cached after a check
+is never older than the versions seen by it - a lagging replica could otherwise put content older than the edit
+back to the cache after its namespace was dropped. Results of quizzes (quiz_tally) are only refreshed
+by their timeout and are loaded from replicas.
+"""
+
+# Cache namespaces holding content of given type
+NAMESPACES = {
+    'menu': ('navigation', 'page_html', 'fragment'),
+    'page': ('page', 'page_html', 'fragment'),
+    'quiz': ('quiz_schema', 'quiz_tally', 'fragment'),
+    'user': ('user',),
+}
+
+_lock = threading.Lock()
+_seen = {}
+_checked = [0]
+
+
+def content_changed(*content_types):
+    """
+    Function marks content types as changed. It has to be called before commit of the change.
+    Caches of the content are dropped in this process at once, other processes drop them on their next check.
+    :param content_types: names of content types (see ContentVersion.CONTENT_TYPES)
+    """
+    ContentVersion.bump(*content_types)
+    for content_type in content_types:
+        for namespace in NAMESPACES.get(content_type, ()):
+            cache.delete_namespace(namespace)
+
+
+def load_from_primary(loader):
+    """
+    Function wraps loader of cached content, so it reads from the primary database.
+    :param loader: function without parameters
+    :return: function without parameters
+    """
+    def load():
+        with db.session.primary_reads():
+            return loader()
+    return load
+
+
+def check_content_versions():
+    """
+    Function drops cache namespaces of content changed by any process since the last check.
+    Does nothing if the last check was less than CONTENT_VERSION_CHECK_INTERVAL seconds ago.
+    """
+    now = time.time()
+    if now - _checked[0] < app.config['CONTENT_VERSION_CHECK_INTERVAL'] or not _lock.acquire(False):
+        return
+    try:
+        _checked[0] = now
+        versions = ContentVersion.versions()
+        for content_type, version in versions.items():
+            # On the first check nothing is known about content cached so far, so everything is dropped.
+            if _seen.get(content_type) != version:
+                for namespace in NAMESPACES.get(content_type, ()):
+                    cache.delete_namespace(namespace)
+        _seen.clear()
+        _seen.update(versions)
+    finally:
+        _lock.release()
+
+
+def mark_seen(versions):
+    """
+    Function sets versions of content cached so far, so the next check drops only content changed since then
+    (used when the cache is filled before the first request, see warmup.py).
+    :param versions: dict (content_type: version)
+    """
+    with _lock:
+        _checked[0] = time.time()
+        _seen.clear()
+        _seen.update(versions)
+
+
+def seen_versions():
+    """
+    Function returns versions of content types seen by the last check.
+    :return: dict (content_type: version)
+    """
+    return dict(_seen)
+
+
+def version_tag():
+    """
+    Function returns versions of all content types seen by the last check, e.g. 'menu3.page1.quiz12'.
+    :return: string
+    """
+    return '.'.join('%s%s' % item for item in sorted(_seen.items()))
@@ -0,0 +1,13 @@
+#!flask/bin/python
+import sys
+from app.compaction import compact_submissions, fold_vote_stripes
+
+
+def report(compacted):
+    print('Compacted submissions: ' + str(compacted))
+
+
+full_vacuum = '--vacuum' in sys.argv
+compacted = compact_submissions(full_vacuum=full_vacuum, progress=report)
+print('Done, compacted submissions: ' + str(compacted))
+print('Folded vote bucket stripes: ' + str(fold_vote_stripes()))
@@ -0,0 +1,15 @@
+#!flask/bin/python
+import sys
+from app.quiz_import import read_quiz, import_quiz, QuizImportError
+
+# Usage: database_import_quiz.py FILE.json|FILE.csv [...]
+for path in sys.argv[1:]:
+    try:
+        with open(path, 'rb') as stream:
+            quiz = read_quiz(stream, path)
+    except QuizImportError as error:
+        print('%s is invalid:' % path)
+        for message in error.errors:
+            print('    ' + message)
+        sys.exit(1)
+    print('Imported %s as quiz %d' % (path, import_quiz(quiz)))
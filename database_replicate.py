@@ -0,0 +1,13 @@
+#!flask/bin/python
+import time
+from sqlalchemy.engine.url import make_url
+from config import SQLALCHEMY_DATABASE_URI, SQLALCHEMY_REPLICA_URIS, REPLICA_SYNC_INTERVAL
+from app.routing import sync_sqlite_replica
+
+# PostgreSQL replicas are kept in sync by the server (streaming replication), only SQLite ones are copied here.
+primary = make_url(SQLALCHEMY_DATABASE_URI).database
+replicas = [make_url(uri).database for uri in SQLALCHEMY_REPLICA_URIS if uri.startswith('sqlite:')]
+while True:
+    for replica in replicas:
+        sync_sqlite_replica(primary, replica)
+    time.sleep(REPLICA_SYNC_INTERVAL)
@@ -1,7 +1,10 @@
 #!flask/bin/python
+import logging
 from migrate.versioning import api
 from config import SQLALCHEMY_DATABASE_URI
 from config import SQLALCHEMY_MIGRATE_REPO
+# Progress of online migrations (see db_repository/online.py)
+logging.basicConfig(level=logging.INFO, format='%(message)s')
 api.upgrade(SQLALCHEMY_DATABASE_URI, SQLALCHEMY_MIGRATE_REPO)
 v = api.db_version(SQLALCHEMY_DATABASE_URI, SQLALCHEMY_MIGRATE_REPO)
 print('Current database version: ' + str(v))
@@ -0,0 +1,142 @@
+from sqlalchemy import *
+from migrate.versioning.repository import Repository
+
+"""
+Contains baseline of the database schema - all migrations up to BASELINE_VERSION squashed into one snapshot.
+New database is created from it at once (see database_create.py) and only migrations newer than the baseline
+are replayed. Like the migrations, it has no foreign keys (models declare them only for relationships), so both
+ways give the same schema. The snapshot is frozen: don't change it when models change, add a migration instead
+(and move the baseline forward only together with a new snapshot).
+"""
+
+BASELINE_VERSION = 40
+
+meta = MetaData()
+page = Table('page', meta,
+    Column('id', Integer, primary_key=True, nullable=False),
+    Column('link', String(length=50)),
+    Column('title', String(length=50)),
+    Column('title_en', String(length=50)),
+    Column('content', Text),
+    Column('content_en', Text),
+    Column('img_name', String(length=50)),
+)
+user = Table('user', meta,
+    Column('id', Integer, primary_key=True, nullable=False),
+    Column('nickname', String(length=32), index=True, unique=True),
+    Column('email', String(length=80), index=True, unique=True),
+    Column('permission', Integer),
+    Column('register_date', DateTime),
+)
+menu = Table('menu', meta,
+    Column('id', Integer, primary_key=True, nullable=False),
+    Column('sequence', Integer, index=True, unique=True),
+    Column('link', String(length=50)),
+    Column('type', Integer),
+    Column('caption', String(length=50), index=True, unique=True),
+    Column('caption_en', String(length=50), index=True, unique=True),
+)
+submenu = Table('submenu', meta,
+    Column('id', Integer, primary_key=True, nullable=False),
+    Column('sequence', Integer, index=True),
+    Column('link', String(length=50)),
+    Column('caption', String(length=50), index=True, unique=True),
+    Column('caption_en', String(length=50), index=True, unique=True),
+    Column('section_id', Integer),
+)
+quiz = Table('quiz', meta,
+    Column('id', Integer, primary_key=True, nullable=False),
+    Column('name', String(length=100)),
+    Column('name_en', String(length=100)),
+    Column('counter_stripes', Integer),
+)
+quiz_question = Table('quiz_question', meta,
+    Column('id', Integer, primary_key=True, nullable=False),
+    Column('question', String(length=255)),
+    Column('question_en', String(length=255)),
+    Column('quiz_id', Integer),
+)
+quiz_answer_option = Table('quiz_answer_option', meta,
+    Column('id', Integer, primary_key=True, nullable=False),
+    Column('answer', String),
+    Column('answer_en', String),
+    Column('quiz_question_id', Integer),
+)
+quiz_submission = Table('quiz_submission', meta,
+    Column('id', Integer, primary_key=True, nullable=False),
+    Column('quiz_id', Integer, index=True),
+    Column('created_at', DateTime, index=True),
+    Column('option_ids', LargeBinary),
+)
+quiz_answer_tally = Table('quiz_answer_tally', meta,
+    Column('id', Integer, primary_key=True, nullable=False),
+    Column('quiz_id', Integer, index=True),
+    Column('quiz_answer_option_id', Integer, unique=True),
+    Column('votes', Integer),
+)
+quiz_vote_bucket = Table('quiz_vote_bucket', meta,
+    Column('id', Integer, primary_key=True, nullable=False),
+    Column('quiz_id', Integer),
+    Column('quiz_answer_option_id', Integer),
+    Column('period', String(length=5)),
+    Column('start', DateTime),
+    Column('stripe', Integer),
+    Column('votes', Integer),
+    Index('ix_quiz_vote_bucket_quiz_period_start', 'quiz_id', 'period', 'start'),
+    Index('ux_quiz_vote_bucket_option_period_start_stripe', 'quiz_answer_option_id', 'period', 'start', 'stripe',
+          unique=True),
+)
+vote_log_checkpoint = Table('vote_log_checkpoint', meta,
+    Column('segment', String(length=64), primary_key=True, nullable=False),
+    Column('offset', BigInteger),
+)
+content_version = Table('content_version', meta,
+    Column('content_type', String(length=32), primary_key=True, nullable=False),
+    Column('version', Integer, nullable=False),
+)
+# Table of sqlalchemy-migrate holding version of the database
+migrate_version = Table('migrate_version', MetaData(),
+    Column('repository_id', String(length=250), primary_key=True, nullable=False),
+    Column('repository_path', Text),
+    Column('version', Integer),
+)
+
+
+def bootstrap(url, repository):
+    """
+    Function creates baseline schema with its indexes and initial rows in an empty database and puts the database
+    under version control with BASELINE_VERSION - all in one transaction, so it's created completely or not at all.
+    :param url: URL of the database
+    :param repository: path of the migration repository
+    :return: False if the database is already under version control (nothing is done), True otherwise
+    """
+    engine = create_engine(url)
+    connection = engine.connect()
+    try:
+        if engine.dialect.has_table(connection, 'migrate_version'):
+            return False
+        if engine.dialect.name == 'sqlite':
+            # Lets compaction give free pages back to the file system (see compaction.vacuum()),
+            # the mode can be changed only before the first table is created.
+            connection.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            # pysqlite runs DDL outside of transactions unless the transaction is started explicitly.
+            connection.connection.isolation_level = None
+            connection.execute('BEGIN')
+        transaction = connection.begin()
+        try:
+            meta.create_all(connection)
+            connection.execute(content_version.insert(),
+                               [{'content_type': content_type, 'version': 0}
+                                for content_type in ('menu', 'page', 'quiz', 'user')])
+            migrate_version.create(connection)
+            connection.execute(migrate_version.insert(),
+                               repository_id=Repository(repository).id,
+                               repository_path=repository,
+                               version=BASELINE_VERSION)
+            transaction.commit()
+        except Exception:
+            transaction.rollback()
+            raise
+    finally:
+        connection.close()
+    return True
@@ -0,0 +1,177 @@
+import logging
+import time
+from contextlib import contextmanager
+from sqlalchemy import MetaData, Table, func, select, text
+
+"""
+Contains online migration of large tables, usable in migration scripts instead of column create / drop
+(which rebuild the whole table holding the write lock on SQLite):
+
+    def upgrade(migrate_engine):
+        OnlineMigration(migrate_engine, 'quiz_submission', post_meta.tables['quiz_submission'],
+                        columns={'option_ids': 'options'}).run()
+
+Rows are copied in small batches (each one a short transaction) into a shadow table with the new schema, writes
+made meanwhile are copied by triggers, and then the tables are swapped by renaming them in one short transaction.
+Progress is logged (INFO) unless a progress function is given.
+"""
+
+log = logging.getLogger(__name__)
+
+
+class OnlineMigration(object):
+    """
+    Class representing online rebuild of a table to a new schema.
+    The table has to have a single integer primary key, kept in the new schema under the same name.
+    Names of indexes of the new schema have to differ from the existing ones (index names are global in a database).
+    Parameters:
+        - engine - migrate_engine
+        - table - name of the table
+        - new_table - Table with the new schema (named as the table)
+        - columns - dict {new column: old column} for renamed columns, columns with equal names are copied anyway,
+          the rest of new columns get their server defaults
+        - batch_size - amount of primary keys copied in one transaction
+        - pause - seconds between batches, so writers of the application get their turn
+        - progress - function called after every batch with (copied rows, last copied key, last key to copy),
+          by default progress is logged
+        - drop_old - if False, the old table is kept as '<table>_old'
+    """
+
+    def __init__(self, engine, table, new_table, columns=None, batch_size=5000, pause=0.05, progress=None,
+                 drop_old=True):
+        self.engine = engine
+        self.table = table
+        self.shadow = '%s_shadow' % table
+        self.old_table = '%s_old' % table
+        self.new_table = new_table.tometadata(MetaData(), name=self.shadow)
+        old = Table(table, MetaData(), autoload=True, autoload_with=engine)
+        self.columns = dict((column.name, column.name) for column in self.new_table.columns if column.name in old.c)
+        self.columns.update(columns or {})
+        keys = [column.name for column in old.primary_key.columns]
+        if len(keys) != 1 or keys[0] not in self.columns:
+            raise ValueError('Online migration needs a single primary key kept in the new schema: %s' % table)
+        self.key = keys[0]
+        self.batch_size = batch_size
+        self.pause = pause
+        self.progress = progress or report
+        self.drop_old = drop_old
+        self.sqlite = engine.dialect.name == 'sqlite'
+        self.quote = engine.dialect.identifier_preparer.quote
+
+    def run(self):
+        self.new_table.create(self.engine)
+        with self._transaction() as connection:
+            for statement in self._trigger_statements():
+                connection.execute(statement)
+        self.copy()
+        self.swap()
+        if self.drop_old:
+            with self._transaction() as connection:
+                connection.execute('DROP TABLE %s' % self.quote(self.old_table))
+
+    @contextmanager
+    def _transaction(self):
+        connection = self.engine.connect()
+        isolation_level = connection.connection.isolation_level if self.sqlite else None
+        try:
+            if self.sqlite:
+                # pysqlite runs DDL outside of transactions unless the transaction is started explicitly.
+                connection.connection.isolation_level = None
+                connection.execute('BEGIN IMMEDIATE')
+            with connection.begin():
+                yield connection
+        finally:
+            if self.sqlite:
+                # Connection goes back to the pool, other users expect the default behaviour of pysqlite and SQLite.
+                connection.connection.isolation_level = isolation_level
+                connection.execute('PRAGMA legacy_alter_table = OFF')
+            connection.close()
+
+    def _names(self, prefix=''):
+        new = ', '.join(self.quote(column) for column in self.columns)
+        old = ', '.join(prefix + self.quote(self.columns[column]) for column in self.columns)
+        return new, old
+
+    def _trigger_statements(self):
+        table, shadow, key = self.quote(self.table), self.quote(self.shadow), self.quote(self.key)
+        new_columns, new_values = self._names('NEW.')
+        if self.sqlite:
+            return [
+                'CREATE TRIGGER %s_online_insert AFTER INSERT ON %s BEGIN '
+                'INSERT OR REPLACE INTO %s (%s) VALUES (%s); END' % (self.table, table, shadow, new_columns,
+                                                                     new_values),
+                'CREATE TRIGGER %s_online_update AFTER UPDATE ON %s BEGIN '
+                'DELETE FROM %s WHERE %s = OLD.%s; '
+                'INSERT OR REPLACE INTO %s (%s) VALUES (%s); END' % (self.table, table, shadow, key, key, shadow,
+                                                                     new_columns, new_values),
+                'CREATE TRIGGER %s_online_delete AFTER DELETE ON %s BEGIN '
+                'DELETE FROM %s WHERE %s = OLD.%s; END' % (self.table, table, shadow, key, key),
+            ]
+        updates = ', '.join('%s = EXCLUDED.%s' % (self.quote(column), self.quote(column)) for column in self.columns)
+        return [
+            'CREATE FUNCTION %s_online_sync() RETURNS trigger AS $$ BEGIN '
+            'IF TG_OP IN (\'UPDATE\', \'DELETE\') THEN DELETE FROM %s WHERE %s = OLD.%s; END IF; '
+            'IF TG_OP IN (\'INSERT\', \'UPDATE\') THEN INSERT INTO %s (%s) VALUES (%s) '
+            'ON CONFLICT (%s) DO UPDATE SET %s; END IF; '
+            'RETURN NULL; END $$ LANGUAGE plpgsql' % (self.table, shadow, key, key, shadow, new_columns, new_values,
+                                                      key, updates),
+            'CREATE TRIGGER %s_online_sync AFTER INSERT OR UPDATE OR DELETE ON %s '
+            'FOR EACH ROW EXECUTE PROCEDURE %s_online_sync()' % (self.table, table, self.table),
+        ]
+
+    def copy(self):
+        """
+        Method copies rows existing before the triggers were created, in batches of primary keys.
+        Rows already copied by triggers are newer, so they are left as they are.
+        On PostgreSQL the batch is locked FOR SHARE: a row deleted after the statement started is skipped
+        instead of being copied after its delete trigger already ran.
+        """
+        connection = self.engine.connect()
+        try:
+            key = Table(self.table, MetaData(), autoload=True, autoload_with=self.engine).c[self.key]
+            first, last = connection.execute(select([func.min(key), func.max(key)])).first()
+        finally:
+            connection.close()
+        if first is None:
+            return
+        new_columns, old_columns = self._names()
+        statement = text('INSERT %s INTO %s (%s) SELECT %s FROM %s WHERE %s >= :low AND %s < :high %s' % (
+            'OR IGNORE' if self.sqlite else '', self.quote(self.shadow), new_columns, old_columns,
+            self.quote(self.table), self.quote(self.key), self.quote(self.key),
+            '' if self.sqlite else 'FOR SHARE ON CONFLICT DO NOTHING'))
+        copied = 0
+        low = first
+        while low <= last:
+            high = min(low + self.batch_size, last + 1)
+            with self._transaction() as connection:
+                copied += connection.execute(statement, low=low, high=high).rowcount
+            self.progress(copied, high - 1, last)
+            low = high
+            time.sleep(self.pause)
+
+    def swap(self):
+        """
+        Method replaces the table with the shadow table in one transaction.
+        """
+        table, shadow, old_table = self.quote(self.table), self.quote(self.shadow), self.quote(self.old_table)
+        with self._transaction() as connection:
+            if self.sqlite:
+                # References of other tables have to stay with the name, not follow the renamed old table.
+                connection.execute('PRAGMA legacy_alter_table = ON')
+                for operation in ('insert', 'update', 'delete'):
+                    connection.execute('DROP TRIGGER %s_online_%s' % (self.table, operation))
+            else:
+                connection.execute('DROP TRIGGER %s_online_sync ON %s' % (self.table, table))
+                connection.execute('DROP FUNCTION %s_online_sync()' % self.table)
+            connection.execute('ALTER TABLE %s RENAME TO %s' % (table, old_table))
+            connection.execute('ALTER TABLE %s RENAME TO %s' % (shadow, table))
+            if not self.sqlite:
+                # Copied rows kept their keys, the sequence of the new table has to continue after them.
+                connection.execute(text("SELECT setval(pg_get_serial_sequence(:table, :key), "
+                                        "(SELECT coalesce(max(%s), 0) + 1 FROM %s), false)" % (self.quote(self.key),
+                                                                                               table)),
+                                   table=self.table, key=self.key)
+
+
+def report(copied, key, last):
+    log.info('Copied rows: %d (key %s of %s)', copied, key, last)
@@ -0,0 +1,100 @@
+import datetime
+import struct
+from sqlalchemy import *
+from migrate import *
+
+
+from migrate.changeset import schema
+pre_meta = MetaData()
+post_meta = MetaData()
+quiz_user_answer = Table('quiz_user_answer', pre_meta,
+    Column('id', INTEGER, primary_key=True, nullable=False),
+    Column('quiz_question_id', INTEGER),
+    Column('quiz_answer_option_id', INTEGER),
+)
+
+quiz_question = Table('quiz_question', pre_meta,
+    Column('id', INTEGER, primary_key=True, nullable=False),
+    Column('question', VARCHAR(length=255)),
+    Column('question_en', VARCHAR(length=255)),
+    Column('quiz_id', INTEGER),
+)
+
+quiz_answer_option = Table('quiz_answer_option', pre_meta,
+    Column('id', INTEGER, primary_key=True, nullable=False),
+    Column('answer', VARCHAR),
+    Column('answer_en', VARCHAR),
+    Column('quiz_question_id', INTEGER),
+)
+
+quiz_submission = Table('quiz_submission', post_meta,
+    Column('id', Integer, primary_key=True, nullable=False),
+    Column('quiz_id', Integer, index=True),
+    Column('created_at', DateTime, index=True),
+    Column('option_ids', LargeBinary),
+)
+
+
+def pack(options):
+    return struct.pack('<%dI' % len(options), *options)
+
+
+def unpack(data):
+    return struct.unpack('<%dI' % (len(data) // 4), data)
+
+
+def legacy_submissions(rows, quiz_of_question):
+    """
+    Groups legacy quiz_user_answer rows into submissions.
+    The old quiz view committed answers of one form one after another, so a submission is a run of consecutive rows
+    answering questions of the same quiz, each question at most once.
+    """
+    quiz_id, questions, options = None, set(), []
+    for row in rows:
+        if row.quiz_question_id is None or row.quiz_answer_option_id is None:
+            # Unanswered question - there's no vote to keep.
+            continue
+        row_quiz_id = quiz_of_question.get(row.quiz_question_id)
+        if options and (row_quiz_id != quiz_id or row.quiz_question_id in questions):
+            yield quiz_id, options
+            questions, options = set(), []
+        quiz_id = row_quiz_id
+        questions.add(row.quiz_question_id)
+        options.append(row.quiz_answer_option_id)
+    if options:
+        yield quiz_id, options
+
+
+def upgrade(migrate_engine):
+    # Upgrade operations go here. Don't create your own engine; bind
+    # migrate_engine to your metadata
+    pre_meta.bind = migrate_engine
+    post_meta.bind = migrate_engine
+    post_meta.tables['quiz_submission'].create()
+
+    quiz_of_question = dict(migrate_engine.execute(select([quiz_question.c.id, quiz_question.c.quiz_id])).fetchall())
+    rows = migrate_engine.execute(select([quiz_user_answer]).order_by(quiz_user_answer.c.id)).fetchall()
+    converted_at = datetime.datetime.utcnow()
+    submissions = [{'quiz_id': quiz_id, 'created_at': converted_at, 'option_ids': pack(options)}
+                   for quiz_id, options in legacy_submissions(rows, quiz_of_question)]
+    if submissions:
+        migrate_engine.execute(quiz_submission.insert(), submissions)
+    pre_meta.tables['quiz_user_answer'].drop()
+
+
+def downgrade(migrate_engine):
+    # Operations to reverse the above upgrade go here.
+    pre_meta.bind = migrate_engine
+    post_meta.bind = migrate_engine
+    pre_meta.tables['quiz_user_answer'].create()
+
+    question_of_option = dict(migrate_engine.execute(select([quiz_answer_option.c.id,
+                                                             quiz_answer_option.c.quiz_question_id])).fetchall())
+    rows = []
+    for submission in migrate_engine.execute(select([quiz_submission]).order_by(quiz_submission.c.id)).fetchall():
+        for option_id in unpack(submission.option_ids):
+            rows.append({'quiz_question_id': question_of_option.get(option_id),
+                         'quiz_answer_option_id': option_id})
+    if rows:
+        migrate_engine.execute(quiz_user_answer.insert(), rows)
+    post_meta.tables['quiz_submission'].drop()
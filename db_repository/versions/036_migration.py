@@ -0,0 +1,64 @@
+import struct
+from collections import Counter
+from sqlalchemy import *
+from migrate import *
+
+
+from migrate.changeset import schema
+pre_meta = MetaData()
+post_meta = MetaData()
+quiz_submission = Table('quiz_submission', pre_meta,
+    Column('id', INTEGER, primary_key=True, nullable=False),
+    Column('quiz_id', INTEGER),
+    Column('created_at', DateTime),
+    Column('option_ids', LargeBinary),
+)
+
+quiz_vote_bucket = Table('quiz_vote_bucket', post_meta,
+    Column('id', Integer, primary_key=True, nullable=False),
+    Column('quiz_id', Integer),
+    Column('quiz_answer_option_id', Integer),
+    Column('period', String(length=5)),
+    Column('start', DateTime),
+    Column('votes', Integer),
+    UniqueConstraint('quiz_answer_option_id', 'period', 'start'),
+    Index('ix_quiz_vote_bucket_quiz_period_start', 'quiz_id', 'period', 'start'),
+)
+
+
+def bucket_start(moment, period):
+    if period == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def upgrade(migrate_engine):
+    # Upgrade operations go here. Don't create your own engine; bind
+    # migrate_engine to your metadata
+    pre_meta.bind = migrate_engine
+    post_meta.bind = migrate_engine
+    post_meta.tables['quiz_vote_bucket'].create()
+
+    # Backfill rollups of submissions saved before buckets existed.
+    buckets = Counter()
+    quiz_of_option = {}
+    for submission in migrate_engine.execute(select([quiz_submission])):
+        options = struct.unpack('<%dI' % (len(submission.option_ids) // 4), submission.option_ids)
+        for option_id in options:
+            quiz_of_option[option_id] = submission.quiz_id
+            for period in ('hour', 'day'):
+                buckets[(option_id, period, bucket_start(submission.created_at, period))] += 1
+    rows = [{'quiz_id': quiz_of_option[option_id],
+             'quiz_answer_option_id': option_id,
+             'period': period,
+             'start': start,
+             'votes': votes} for (option_id, period, start), votes in buckets.items()]
+    if rows:
+        migrate_engine.execute(quiz_vote_bucket.insert(), rows)
+
+
+def downgrade(migrate_engine):
+    # Operations to reverse the above upgrade go here.
+    pre_meta.bind = migrate_engine
+    post_meta.bind = migrate_engine
+    post_meta.tables['quiz_vote_bucket'].drop()
@@ -0,0 +1,28 @@
+from sqlalchemy import *
+from migrate import *
+
+
+from migrate.changeset import schema
+pre_meta = MetaData()
+post_meta = MetaData()
+quiz_answer_tally = Table('quiz_answer_tally', post_meta,
+    Column('id', Integer, primary_key=True, nullable=False),
+    Column('quiz_id', Integer, index=True),
+    Column('quiz_answer_option_id', Integer, unique=True),
+    Column('votes', Integer),
+)
+
+
+def upgrade(migrate_engine):
+    # Upgrade operations go here. Don't create your own engine; bind
+    # migrate_engine to your metadata
+    pre_meta.bind = migrate_engine
+    post_meta.bind = migrate_engine
+    post_meta.tables['quiz_answer_tally'].create()
+
+
+def downgrade(migrate_engine):
+    # Operations to reverse the above upgrade go here.
+    pre_meta.bind = migrate_engine
+    post_meta.bind = migrate_engine
+    post_meta.tables['quiz_answer_tally'].drop()
@@ -0,0 +1,83 @@
+from sqlalchemy import *
+from migrate import *
+
+
+from migrate.changeset import schema
+pre_meta = MetaData()
+post_meta = MetaData()
+quiz = Table('quiz', post_meta,
+    Column('id', Integer, primary_key=True, nullable=False),
+    Column('name', String(length=100)),
+    Column('name_en', String(length=100)),
+    Column('counter_stripes', Integer),
+)
+
+quiz_vote_bucket = Table('quiz_vote_bucket', pre_meta,
+    Column('id', INTEGER, primary_key=True, nullable=False),
+    Column('quiz_id', INTEGER),
+    Column('quiz_answer_option_id', INTEGER),
+    Column('period', VARCHAR(length=5)),
+    Column('start', DateTime),
+    Column('votes', INTEGER),
+    UniqueConstraint('quiz_answer_option_id', 'period', 'start'),
+    Index('ix_quiz_vote_bucket_quiz_period_start', 'quiz_id', 'period', 'start'),
+)
+
+# Unique key of buckets changes, so the table is rebuilt: the striped table is created under a temporary name,
+# filled, and renamed when the old one is gone. Indexes are created after the rename.
+striped_vote_bucket = Table('quiz_vote_bucket_striped', post_meta,
+    Column('id', Integer, primary_key=True, nullable=False),
+    Column('quiz_id', Integer),
+    Column('quiz_answer_option_id', Integer),
+    Column('period', String(length=5)),
+    Column('start', DateTime),
+    Column('stripe', Integer),
+    Column('votes', Integer),
+)
+
+bucket_indexes = [
+    ('ux_quiz_vote_bucket_option_period_start_stripe', ('quiz_answer_option_id', 'period', 'start', 'stripe'), True),
+    ('ix_quiz_vote_bucket_quiz_period_start', ('quiz_id', 'period', 'start'), False),
+]
+
+
+def upgrade(migrate_engine):
+    # Upgrade operations go here. Don't create your own engine; bind
+    # migrate_engine to your metadata
+    pre_meta.bind = migrate_engine
+    post_meta.bind = migrate_engine
+    post_meta.tables['quiz'].columns['counter_stripes'].create()
+    migrate_engine.execute(quiz.update().values(counter_stripes=1))
+
+    post_meta.tables['quiz_vote_bucket_striped'].create()
+    columns = ['id', 'quiz_id', 'quiz_answer_option_id', 'period', 'start', 'votes']
+    migrate_engine.execute(striped_vote_bucket.insert().from_select(
+        columns + ['stripe'],
+        select([quiz_vote_bucket.c[column] for column in columns] + [literal(0)])))
+    pre_meta.tables['quiz_vote_bucket'].drop()
+    striped_vote_bucket.rename('quiz_vote_bucket')
+    for name, columns, unique in bucket_indexes:
+        Index(name, *[striped_vote_bucket.c[column] for column in columns], unique=unique).create(migrate_engine)
+    if migrate_engine.dialect.name == 'postgresql':
+        # Copied rows kept their IDs, the sequence of the new table has to continue after them.
+        migrate_engine.execute(text("SELECT setval(pg_get_serial_sequence('quiz_vote_bucket', 'id'), "
+                                    "(SELECT coalesce(max(id), 0) + 1 FROM quiz_vote_bucket), false)"))
+
+
+def downgrade(migrate_engine):
+    # Operations to reverse the above upgrade go here.
+    pre_meta.bind = migrate_engine
+    post_meta.bind = migrate_engine
+    post_meta.tables['quiz'].columns['counter_stripes'].drop()
+
+    striped = Table('quiz_vote_bucket', MetaData(bind=migrate_engine), autoload=True)
+    striped.rename('quiz_vote_bucket_striped')
+    for name, columns, unique in bucket_indexes:
+        Index(name, *[striped.c[column] for column in columns]).drop(migrate_engine)
+    pre_meta.tables['quiz_vote_bucket'].create()
+    migrate_engine.execute(quiz_vote_bucket.insert().from_select(
+        ['quiz_id', 'quiz_answer_option_id', 'period', 'start', 'votes'],
+        select([striped.c.quiz_id, striped.c.quiz_answer_option_id, striped.c.period, striped.c.start,
+                func.sum(striped.c.votes)])
+        .group_by(striped.c.quiz_id, striped.c.quiz_answer_option_id, striped.c.period, striped.c.start)))
+    striped.drop()
@@ -0,0 +1,29 @@
+from sqlalchemy import *
+from migrate import *
+
+
+from migrate.changeset import schema
+pre_meta = MetaData()
+post_meta = MetaData()
+content_version = Table('content_version', post_meta,
+    Column('content_type', String(length=32), primary_key=True, nullable=False),
+    Column('version', Integer, nullable=False),
+)
+
+
+def upgrade(migrate_engine):
+    # Upgrade operations go here. Don't create your own engine; bind
+    # migrate_engine to your metadata
+    pre_meta.bind = migrate_engine
+    post_meta.bind = migrate_engine
+    post_meta.tables['content_version'].create()
+    migrate_engine.execute(content_version.insert(),
+                           [{'content_type': content_type, 'version': 0}
+                            for content_type in ('menu', 'page', 'quiz', 'user')])
+
+
+def downgrade(migrate_engine):
+    # Operations to reverse the above upgrade go here.
+    pre_meta.bind = migrate_engine
+    post_meta.bind = migrate_engine
+    post_meta.tables['content_version'].drop()
@@ -1,7 +1,8 @@
 from flask_wtf import Form
-from wtforms import StringField, BooleanField, TextAreaField, SelectField
+from flask_wtf.file import FileField, FileRequired, FileAllowed
+from wtforms import StringField, BooleanField, TextAreaField, SelectField, IntegerField
 from wtforms.ext.sqlalchemy.fields import QuerySelectField
-from wtforms.validators import DataRequired
+from wtforms.validators import DataRequired, NumberRange
 
 from app.models import User, Menu, Quiz, QuizQuestion
 
@@ -90,9 +91,11 @@ class QuizForm(Form):
     Contains field:
         - name (text field)
         - name_en (text field)
+        - counter_stripes (integer field)
     """
     name = StringField('name', validators=[DataRequired()])
     name_en = StringField('name_en', validators=[DataRequired()])
+    counter_stripes = IntegerField('counter_stripes', default=1, validators=[NumberRange(min=1, max=64)])
 
 
 def quiz_query():
@@ -164,3 +167,36 @@ class UserForm(Form):
                                         'Please choose another one.')
             return False
         return True
+
+
+class QuizImportForm(Form):
+    """
+    Class representing Quiz Import Form.
+    Contains fields:
+        - file - JSON or CSV file with a whole quiz (see quiz_import.py)
+    """
+    file = FileField('file', validators=[FileRequired(), FileAllowed(['json', 'csv'])])
+
+
+class BulkActionForm(Form):
+    """
+    Class representing Bulk Action Form of admin tables (rows are selected by checkboxes named ids).
+    Contains fields:
+        - action - delete, move or set (selection)
+        - target - ID of element rows are moved to
+        - field - name of field to set
+        - value - new value of the field (text field)
+    """
+    action = SelectField('action', choices=[('delete', 'delete'), ('move', 'move'), ('set', 'set')])
+    target = IntegerField('target', default=None)
+    field = StringField('field')
+    value = StringField('value')
+
+
+class ReorderForm(Form):
+    """
+    Class representing Reorder Form of menus or submenus of a menu.
+    Contains fields:
+        - ids - IDs of all elements in the new order, separated by commas
+    """
+    ids = StringField('ids', validators=[DataRequired()])
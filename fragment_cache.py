@@ -0,0 +1,54 @@
+from flask import g, session
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+from app import app
+from .cache import get_or_set
+from .content_version import load_from_primary, version_tag
+
+"""
+Contains template tag caching rendered fragments of templates:
+
+    {% cache 'footer' %} ... {% endcache %}
+    {% cache 'head', css_name, title %} ... {% endcache %}
+
+Fragment is cached under its name, additional values it depends on, language, role of the user and versions
+of content, so personalized pages still reuse shared parts like navigation and a fragment is rendered again
+after any content is edited.
+"""
+
+
+class FragmentCacheExtension(Extension):
+    """
+    Class representing Jinja extension with {% cache name[, value, ...] %} ... {% endcache %} tag.
+    """
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render', [nodes.List(parts)]), [], [], body).set_lineno(lineno)
+
+    def _render(self, parts, caller):
+        key = 'fragment:%s:%s:%s:%s' % (':'.join(str(part) for part in parts),
+                                        session.get('lang'),
+                                        user_role(),
+                                        version_tag())
+        return Markup(get_or_set(key,
+                                 load_from_primary(lambda: str(caller())),
+                                 app.config['CACHE_TIMEOUT'],
+                                 app.config['CACHE_STALE']))
+
+
+def user_role():
+    """
+    Function returns role of the current user used in keys of fragments.
+    :return: 'anonymous' or permission of logged in user
+    """
+    user = g.get('user')
+    if user is None or not user.is_authenticated:
+        return 'anonymous'
+    return 'permission%s' % user.permission
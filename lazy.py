@@ -0,0 +1,75 @@
+import importlib.util
+import sys
+import threading
+from functools import wraps
+from flask import request
+
+"""
+Contains lazy loading of optional parts of an application (OpenID login, forms of admin panel), so starting
+a worker or a script importing the application doesn't pay for libraries used only by some requests.
+"""
+
+
+def lazy_import(name):
+    """
+    Function returns module which is executed on first access to its attribute (not on import).
+    Use its attributes (module.Name) - `from module import Name` accesses them right away.
+    :param name: absolute name of module
+    :return: module
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+class LazyOpenID(object):
+    """
+    Class representing Flask-OpenID extension which is imported and created on first login, with the same decorators
+    (loginhandler, after_login) and methods (e.g. try_login).
+    """
+
+    def __init__(self, app, fs_store_path):
+        self.app = app
+        self.fs_store_path = fs_store_path
+        self._openid = None
+        self._after_login = None
+        self._lock = threading.Lock()
+
+    @property
+    def openid(self):
+        if self._openid is None:
+            with self._lock:
+                if self._openid is None:
+                    from flask_openid import OpenID
+                    openid = OpenID(self.app, self.fs_store_path)
+                    if self._after_login is not None:
+                        openid.after_login(self._after_login)
+                    self._openid = openid
+        return self._openid
+
+    def after_login(self, f):
+        self._after_login = f
+        if self._openid is not None:
+            self._openid.after_login(f)
+        return f
+
+    def loginhandler(self, f):
+        """
+        Decorator of login function - the extension is needed only when OpenID provider returns to it,
+        showing the login page doesn't load it.
+        """
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if request.args.get('openid_complete') != 'yes':
+                return f(*args, **kwargs)
+            return self.openid.loginhandler(f)(*args, **kwargs)
+        return decorated
+
+    def __getattr__(self, name):
+        return getattr(self.openid, name)
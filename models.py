@@ -1,5 +1,10 @@
-from app import db
+import datetime
+import random
+import struct
+from collections import Counter
 from hashlib import md5
+from sqlalchemy.exc import IntegrityError
+from app import db
 
 """
 Contains all models of an application.
@@ -8,6 +13,55 @@ If you make any modifications over here, keep in mind that you have to use datab
 """
 
 
+def reorder(query, column, ids):
+    """
+    Function sets sequence of rows selected by query to their position in ids (counted from 1), in the current
+    transaction (it has to be committed by caller). It's done with two statements, so a unique index of the column
+    is never violated, even while single rows are updated:
+        - all rows are shifted below both the old and the new sequences
+        - every row gets its new sequence with one CASE statement
+    :param query: query of all rows being ordered
+    :param column: sequence column of the model
+    :param ids: IDs of all rows selected by query in the new order
+    :raise ValueError: if ids are not exactly IDs of the rows
+    """
+    model = column.class_
+    ids = [int(row_id) for row_id in ids]
+    # Rows are validated against the primary, where they're updated - a replica may not have the latest ones yet.
+    db.session.use_primary()
+    rows = query.with_entities(model.id, column).all()
+    if len(set(ids)) != len(ids) or set(ids) != set(row_id for row_id, sequence in rows):
+        raise ValueError('New order has to contain every element exactly once.')
+    if not rows:
+        return
+    sequences = [sequence for row_id, sequence in rows if sequence is not None] or [0]
+    shift = max(sequences) - min(min(sequences), 1) + 1
+    query.update({column: column - shift}, synchronize_session=False)
+    query.update({column: db.case(dict((row_id, position) for position, row_id in enumerate(ids, 1)),
+                                  value=model.id, else_=column)},
+                 synchronize_session=False)
+
+
+def delete_votes(model, ids):
+    """
+    Function deletes rollups of votes (QuizVoteBucket, QuizAnswerTally) of quizzes, quiz questions or answer options
+    being deleted, in the current transaction (it has to be committed by caller). They refer to the quiz and its
+    options, so they can't outlive them. Call it before the rows are deleted.
+    :param model: Quiz, QuizQuestion or QuizAnswerOption
+    :param ids: IDs of rows being deleted
+    """
+    ids = list(ids)
+    if model is QuizQuestion:
+        ids = [option_id for option_id, in db.session.query(QuizAnswerOption.id)
+               .filter(QuizAnswerOption.quiz_question_id.in_(ids))]
+        model = QuizAnswerOption
+    if not ids:
+        return
+    for rollup in (QuizVoteBucket, QuizAnswerTally):
+        column = rollup.quiz_id if model is Quiz else rollup.quiz_answer_option_id
+        db.session.query(rollup).filter(column.in_(ids)).delete(synchronize_session=False)
+
+
 class Page(db.Model):
     """
     Class representing Page model.
@@ -87,6 +141,18 @@ class User(db.Model):
             version += 1
         return new_nickname
 
+    def record(self):
+        """
+        Method returns fields of user as plain data (safe to cache and share between processes), User(**record)
+        creates equal user again.
+        :return: dict
+        """
+        return {'id': self.id,
+                'nickname': self.nickname,
+                'email': self.email,
+                'permission': self.permission,
+                'register_date': self.register_date}
+
     @property
     def is_authenticated(self):
         return True
@@ -141,6 +207,39 @@ class Menu(db.Model):
     caption = db.Column(db.String(50), index=True, unique=True)
     caption_en = db.Column(db.String(50), index=True, unique=True)
 
+    @staticmethod
+    def navigation():
+        """
+        Method returns navigation of the website as plain data (safe to cache and share between processes),
+        loaded with two queries. Every menu is a dict with fields of Menu and 'submenus' - list of dicts with fields
+        of its Submenus, ordered by sequence.
+        :return: list of dicts ordered by sequence
+        """
+        menus = [{'id': menu.id,
+                  'sequence': menu.sequence,
+                  'link': menu.link,
+                  'type': menu.type,
+                  'caption': menu.caption,
+                  'caption_en': menu.caption_en,
+                  'submenus': []} for menu in Menu.query.order_by(Menu.sequence)]
+        by_id = dict((menu['id'], menu) for menu in menus)
+        for submenu in Submenu.query.order_by(Submenu.sequence, Submenu.id):
+            if submenu.section_id in by_id:
+                by_id[submenu.section_id]['submenus'].append({'id': submenu.id,
+                                                              'sequence': submenu.sequence,
+                                                              'link': submenu.link,
+                                                              'caption': submenu.caption,
+                                                              'caption_en': submenu.caption_en})
+        return menus
+
+    @staticmethod
+    def reorder(ids):
+        """
+        Method sets order of all menus in the current transaction (it has to be committed by caller).
+        :param ids: IDs of all menus in the new order
+        """
+        reorder(Menu.query, Menu.sequence, ids)
+
     def __repr__(self):
         """
         Method returns string representation of class, used for debugging and also useful in forms to display menu
@@ -177,7 +276,7 @@ class Submenu(db.Model):
     caption_en = db.Column(db.String(50), index=True, unique=True)
     section_id = db.Column(db.Integer, db.ForeignKey('menu.id'))
     menu = db.relationship('Menu',
-                           backref=db.backref('submenus', lazy='dynamic'))
+                           backref=db.backref('submenus', lazy='dynamic', order_by='Submenu.sequence'))
 
     def __init__(self, sequence, link, caption, caption_en, menu):
         self.sequence = sequence
@@ -186,6 +285,15 @@ class Submenu(db.Model):
         self.caption_en = caption_en
         self.menu = menu
 
+    @staticmethod
+    def reorder(menu_id, ids):
+        """
+        Method sets order of all submenus of a menu in the current transaction (it has to be committed by caller).
+        :param menu_id: ID of the menu
+        :param ids: IDs of all submenus of the menu in the new order
+        """
+        reorder(Submenu.query.filter_by(section_id=menu_id), Submenu.sequence, ids)
+
 
 class Quiz(db.Model):
     """
@@ -194,6 +302,8 @@ class Quiz(db.Model):
     Contains:
         - name of a Quiz
         - name of a Quiz in english
+        - counter_stripes - amount of QuizVoteBucket rows (stripes) per answer option and bucket, a vote is added
+            to a random one. More stripes let more voters of a popular quiz write at once (see QuizVoteBucket).
  
     It's matched with QuizQuestion - one Quiz can have (0 to n) questions,
     but one question can be matched only with one Quiz. (one-to-many relation)
@@ -202,6 +312,7 @@ class Quiz(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100))
     name_en = db.Column(db.String(100))
+    counter_stripes = db.Column(db.Integer, default=1)
 
     def __repr__(self):
         """
@@ -226,7 +337,7 @@ class QuizQuestion(db.Model):
                 but one QuizAnswer can be matched only with one QuizQuestion.
                 (one-to-many relation)
     Other tables (models) matched with QuizQuestion:
-        - QuizUserAnswer - check QuizUserAnswer docs.
+        - QuizSubmission - check QuizSubmission docs.
     """
     __tablename__ = 'quiz_question'
     id = db.Column(db.Integer, primary_key=True)
@@ -234,7 +345,7 @@ class QuizQuestion(db.Model):
     question_en = db.Column(db.String(255))
     quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'))
     quiz = db.relationship('Quiz',
-                           backref=db.backref('questions', lazy='dynamic'))
+                           backref=db.backref('questions', lazy='dynamic', order_by='QuizQuestion.id'))
 
     def __init__(self, question, question_en, quiz):
         self.question = question
@@ -259,8 +370,8 @@ class QuizAnswerOption(db.Model):
         - QuizQuestion - one QuizQuestion can have (0 to n) answers,
                 but one answer can be matched only with one QuizQuestion.
                 (one-to-many relation)
-    Other tables (models) matched with QuizQuestion:
-        - QuizUserAnswer - check QuizUserAnswer docs.
+    Other tables (models) matched with QuizAnswerOption:
+        - QuizSubmission - check QuizSubmission docs.
     """
     __tablename__ = 'quiz_answer_option'
     id = db.Column(db.Integer, primary_key=True)
@@ -268,7 +379,7 @@ class QuizAnswerOption(db.Model):
     answer_en = db.Column(db.String)
     quiz_question_id = db.Column(db.Integer, db.ForeignKey('quiz_question.id'))
     quiz_question = db.relationship('QuizQuestion',
-                                    backref=db.backref('answers', lazy='dynamic'))
+                                    backref=db.backref('answers', lazy='dynamic', order_by='QuizAnswerOption.id'))
 
     def __init__(self, answer, answer_en, quiz_question):
         self.answer = answer
@@ -276,21 +387,340 @@ class QuizAnswerOption(db.Model):
         self.quiz_question = quiz_question
 
 
-class QuizUserAnswer(db.Model):
+class QuizSubmission(db.Model):
     """
-    Class representing QuizUserAnswer model.
-    It's a single choice of a person that fills the quiz.
-    Contains QuizQuestion and QuizAnswerOption.
-    It's matching one QuizQuestion with one QuizAnswerOption. (many-to-many relation)
+    Class representing QuizSubmission model.
+    It's a complete set of choices of a person that filled the quiz - one row per submitted form.
+    Contains fields:
+        - quiz_id - the Quiz which was filled
+        - created_at - the date when the form was submitted
+        - option_ids - IDs of chosen QuizAnswerOptions packed as an array of unsigned 32-bit integers
+            (little endian), one item per answered question, in the order of quiz.questions.
+            e.g. options (4, 9, 13) are stored as 12 bytes instead of 3 separate rows.
     The quiz is anonymous so it don't need any user matched with this.
     """
+    __tablename__ = 'quiz_submission'
     id = db.Column(db.Integer, primary_key=True)
-    quiz_question_id = db.Column(db.Integer, db.ForeignKey('quiz_question.id'))
-    quiz_question = db.relationship('QuizQuestion',
-                                    backref=db.backref('user_question', lazy='dynamic'))
-    quiz_answer_option_id = db.Column(db.Integer, db.ForeignKey('quiz_answer_option.id'))
-    quiz_answer_option = db.relationship('QuizAnswerOption',
-                                         backref=db.backref('user_answer', lazy='dynamic'))
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), index=True)
+    quiz = db.relationship('Quiz',
+                           backref=db.backref('submissions', lazy='dynamic'))
+    created_at = db.Column(db.DateTime, index=True)
+    option_ids = db.Column(db.LargeBinary)
+
+    def __init__(self, quiz, options, created_at=None):
+        self.quiz = quiz
+        self.options = options
+        self.created_at = created_at or datetime.datetime.utcnow()
+
+    @staticmethod
+    def pack_options(options):
+        """
+        Method packs IDs of answer options into the storage format of option_ids field.
+        :param options: list of integers
+        :return: bytes
+        """
+        return struct.pack('<%dI' % len(options), *options)
+
+    @staticmethod
+    def unpack_options(data):
+        """
+        Method unpacks option_ids field back into IDs of answer options.
+        :param data: bytes
+        :return: tuple of integers
+        """
+        if not data:
+            return ()
+        return struct.unpack('<%dI' % (len(data) // 4), data)
+
+    @property
+    def options(self):
+        return QuizSubmission.unpack_options(self.option_ids)
+
+    @options.setter
+    def options(self, options):
+        self.option_ids = QuizSubmission.pack_options(options)
+
+    @staticmethod
+    def option_counts(quiz_id):
+        """
+        Method returns how many times each answer option of a quiz was chosen.
+        Votes of submissions already compacted are read from QuizAnswerTally, the rest is counted from packed arrays
+        (no ORM objects), so the cost is one indexed scan of the recent submissions of the quiz.
+        :param quiz_id: ID of quiz
+        :return: dict {QuizAnswerOption.id: count}
+        """
+        counts = Counter(dict(db.session.query(QuizAnswerTally.quiz_answer_option_id, QuizAnswerTally.votes)
+                              .filter(QuizAnswerTally.quiz_id == quiz_id)))
+        rows = db.session.query(QuizSubmission.option_ids).filter(QuizSubmission.quiz_id == quiz_id)
+        for data, in rows.yield_per(1000):
+            counts.update(QuizSubmission.unpack_options(data))
+        return counts
 
     def __repr__(self):
-        return 'Question: %s \nAnswer: %s' % (self.quiz_question.question, self.quiz_answer_option.answer)
+        return '<QuizSubmission %r, quiz: %r, options: %r>' % (self.id, self.quiz_id, self.options)
+
+
+class QuizAnswerTally(db.Model):
+    """
+    Class representing QuizAnswerTally model.
+    It's the amount of votes for an answer option folded from submissions removed by compaction (see compaction.py).
+    Together with the submissions that are still stored it gives the total result of the quiz.
+    Contains fields:
+        - quiz_id - the Quiz the answer option belongs to
+        - quiz_answer_option_id - the QuizAnswerOption
+        - votes - amount of votes of compacted submissions
+    """
+    __tablename__ = 'quiz_answer_tally'
+    id = db.Column(db.Integer, primary_key=True)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), index=True)
+    quiz_answer_option_id = db.Column(db.Integer, db.ForeignKey('quiz_answer_option.id'), unique=True)
+    votes = db.Column(db.Integer, default=0)
+
+
+class QuizVoteBucket(db.Model):
+    """
+    Class representing QuizVoteBucket model.
+    It's a rollup of votes - how many times an answer option was chosen within one hour or one day.
+    Buckets are updated incrementally when a submission is saved, so trend charts never have to read QuizSubmission.
+    Contains fields:
+        - quiz_id - the Quiz the answer option belongs to (kept here to select whole quiz without joins)
+        - quiz_answer_option_id - the chosen QuizAnswerOption
+        - period - size of the bucket, one of PERIODS
+            e.g. period = 'hour' --> start = 2017-05-10 14:00, covers votes from 14:00 to 14:59:59
+        - start - the beginning of the bucket
+        - stripe - number of the sub-counter of the bucket
+            A popular option would make every voter update the same row, so the bucket is split into
+            Quiz.counter_stripes rows, every vote goes to a random one and readers sum them.
+            Stripes of closed buckets are folded into stripe 0 by fold_stripes().
+        - votes - amount of votes in the bucket (stripe)
+    """
+    __tablename__ = 'quiz_vote_bucket'
+    __table_args__ = (db.Index('ux_quiz_vote_bucket_option_period_start_stripe',
+                               'quiz_answer_option_id', 'period', 'start', 'stripe', unique=True),
+                      db.Index('ix_quiz_vote_bucket_quiz_period_start', 'quiz_id', 'period', 'start'))
+    PERIODS = {'hour': datetime.timedelta(hours=1),
+               'day': datetime.timedelta(days=1)}
+
+    id = db.Column(db.Integer, primary_key=True)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'))
+    quiz_answer_option_id = db.Column(db.Integer, db.ForeignKey('quiz_answer_option.id'))
+    period = db.Column(db.String(5))
+    start = db.Column(db.DateTime)
+    stripe = db.Column(db.Integer, default=0)
+    votes = db.Column(db.Integer, default=0)
+
+    @staticmethod
+    def bucket_start(moment, period):
+        """
+        Method returns the beginning of the bucket that contains given moment.
+        :param moment: datetime
+        :param period: 'hour' or 'day'
+        :return: datetime
+        """
+        if period == 'hour':
+            return moment.replace(minute=0, second=0, microsecond=0)
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    @staticmethod
+    def add_votes(quiz_id, moment, counts, stripes=1):
+        """
+        Method adds votes to hourly and daily buckets containing given moment (to a random stripe of each).
+        Each period costs one SELECT, one UPDATE of the existing buckets and one INSERT of the missing ones,
+        no matter how many options were chosen. It doesn't commit - it's a part of the caller's transaction.
+        :param quiz_id: ID of quiz
+        :param moment: datetime of the votes
+        :param counts: dict {QuizAnswerOption.id: votes}
+        :param stripes: Quiz.counter_stripes
+        """
+        table = QuizVoteBucket.__table__
+        stripe = random.randrange(stripes or 1)
+        for period in QuizVoteBucket.PERIODS:
+            start = QuizVoteBucket.bucket_start(moment, period)
+            in_bucket = db.and_(table.c.period == period,
+                                table.c.start == start,
+                                table.c.stripe == stripe,
+                                table.c.quiz_answer_option_id.in_(list(counts)))
+            existing = set(row[0] for row in
+                           db.session.execute(db.select([table.c.quiz_answer_option_id]).where(in_bucket)))
+            for votes in set(counts[option_id] for option_id in existing):
+                options = [option_id for option_id in existing if counts[option_id] == votes]
+                db.session.execute(table.update()
+                                   .where(db.and_(in_bucket, table.c.quiz_answer_option_id.in_(options)))
+                                   .values(votes=table.c.votes + votes))
+            missing = [{'quiz_id': quiz_id,
+                        'quiz_answer_option_id': option_id,
+                        'period': period,
+                        'start': start,
+                        'stripe': stripe,
+                        'votes': votes} for option_id, votes in counts.items() if option_id not in existing]
+            if missing:
+                try:
+                    with db.session.begin_nested():
+                        db.session.execute(table.insert(), missing)
+                except IntegrityError:
+                    # Another worker has just opened some of these buckets - add to them one by one.
+                    for row in missing:
+                        try:
+                            with db.session.begin_nested():
+                                db.session.execute(table.insert(), row)
+                        except IntegrityError:
+                            db.session.execute(table.update()
+                                               .where(db.and_(table.c.period == period,
+                                                              table.c.start == start,
+                                                              table.c.stripe == stripe,
+                                                              table.c.quiz_answer_option_id ==
+                                                              row['quiz_answer_option_id']))
+                                               .values(votes=table.c.votes + row['votes']))
+
+    @staticmethod
+    def fold_stripes(until):
+        """
+        Method folds stripes of buckets which ended before given moment into stripe 0 (nobody votes into them anymore,
+        so there's no need to keep them split). Stripe rows of every period are deleted with one statement which
+        returns their votes (PostgreSQL), so a vote committed meanwhile is either folded or left in its stripe, never
+        lost. Their sums are added to stripe 0 rows with one executemany UPDATE, missing stripe 0 rows are inserted.
+        It doesn't commit - it's a part of the caller's transaction.
+        :param until: datetime
+        :return: amount of deleted stripe rows
+        """
+        table = QuizVoteBucket.__table__
+        deleted = 0
+        for period, length in QuizVoteBucket.PERIODS.items():
+            closed = db.and_(table.c.period == period, table.c.start <= until - length)
+            stripes = db.and_(closed, table.c.stripe > 0)
+            columns = [table.c.quiz_id, table.c.quiz_answer_option_id, table.c.start, table.c.votes]
+            if db.engine.dialect.name == 'postgresql':
+                rows = db.session.execute(table.delete().where(stripes).returning(*columns)).fetchall()
+            else:
+                # SQLite has a single writer - the rows can't change between the two statements of the transaction.
+                rows = db.session.execute(db.select(columns).where(stripes)).fetchall()
+                db.session.execute(table.delete().where(stripes))
+            if not rows:
+                continue
+            sums = Counter()
+            for quiz_id, option_id, start, votes in rows:
+                sums[(quiz_id, option_id, start)] += votes or 0
+            starts = [start for quiz_id, option_id, start in sums]
+            existing = set((option_id, start) for option_id, start in
+                           db.session.execute(db.select([table.c.quiz_answer_option_id, table.c.start])
+                                              .where(db.and_(table.c.period == period,
+                                                             table.c.stripe == 0,
+                                                             table.c.start.between(min(starts), max(starts))))))
+            updates = [{'option_id': option_id, 'bucket_start': start, 'added': votes}
+                       for (quiz_id, option_id, start), votes in sums.items() if (option_id, start) in existing]
+            inserts = [{'quiz_id': quiz_id, 'quiz_answer_option_id': option_id, 'period': period, 'start': start,
+                        'stripe': 0, 'votes': votes}
+                       for (quiz_id, option_id, start), votes in sums.items() if (option_id, start) not in existing]
+            if updates:
+                db.session.execute(table.update()
+                                   .where(db.and_(table.c.quiz_answer_option_id == db.bindparam('option_id'),
+                                                  table.c.period == period,
+                                                  table.c.start == db.bindparam('bucket_start'),
+                                                  table.c.stripe == 0))
+                                   .values(votes=table.c.votes + db.bindparam('added')),
+                                   updates)
+            if inserts:
+                db.session.execute(table.insert(), inserts)
+            deleted += len(rows)
+        return deleted
+
+    @staticmethod
+    def series(quiz_id, start, end, period='hour'):
+        """
+        Method returns votes of a quiz in time, one point per bucket that has any votes.
+        :param quiz_id: ID of quiz
+        :param start: datetime, beginning of the range (rounded down to the bucket)
+        :param end: datetime, end of the range (exclusive)
+        :param period: 'hour' or 'day'
+        :return: list of tuples (bucket start, {QuizAnswerOption.id: votes})
+        """
+        table = QuizVoteBucket.__table__
+        rows = db.session.execute(db.select([table.c.start, table.c.quiz_answer_option_id, db.func.sum(table.c.votes)])
+                                  .where(db.and_(table.c.quiz_id == quiz_id,
+                                                 table.c.period == period,
+                                                 table.c.start >= QuizVoteBucket.bucket_start(start, period),
+                                                 table.c.start < end))
+                                  .group_by(table.c.start, table.c.quiz_answer_option_id)
+                                  .order_by(table.c.start))
+        points = []
+        for bucket, option_id, votes in rows:
+            if not points or points[-1][0] != bucket:
+                points.append((bucket, {}))
+            points[-1][1][option_id] = int(votes)
+        return points
+
+    @staticmethod
+    def totals(quiz_id, start, end):
+        """
+        Method returns votes of a quiz in given range (rounded to full hours).
+        Whole days are summed from daily buckets and only the ragged edges from hourly ones.
+        :param quiz_id: ID of quiz
+        :param start: datetime
+        :param end: datetime (exclusive)
+        :return: Counter {QuizAnswerOption.id: votes}
+        """
+        first_day = QuizVoteBucket.bucket_start(start, 'day')
+        if first_day < start:
+            first_day += QuizVoteBucket.PERIODS['day']
+        last_day = QuizVoteBucket.bucket_start(end, 'day')
+        if first_day >= last_day:
+            ranges = [('hour', start, end)]
+        else:
+            ranges = [('hour', start, first_day), ('day', first_day, last_day), ('hour', last_day, end)]
+        counts = Counter()
+        for period, range_start, range_end in ranges:
+            for bucket, votes in QuizVoteBucket.series(quiz_id, range_start, range_end, period):
+                counts.update(votes)
+        return counts
+
+
+class VoteLogCheckpoint(db.Model):
+    """
+    Class representing VoteLogCheckpoint model.
+    It's the position up to which a segment of the vote log (see votelog.py) was saved in the database.
+    It's updated in the same transaction as saved votes, so ingestion can be safely restarted after a crash.
+    Contains fields:
+        - segment - name of the segment file (without extension)
+        - offset - amount of bytes of the segment already saved
+    """
+    __tablename__ = 'vote_log_checkpoint'
+    segment = db.Column(db.String(64), primary_key=True)
+    offset = db.Column(db.BigInteger, default=0)
+
+
+class ContentVersion(db.Model):
+    """
+    Class representing ContentVersion model.
+    It's a counter of changes of one type of content, bumped by admin panel in the same transaction as the change.
+    Every process compares it with versions it has seen to find out which of its caches are stale
+    (see content_version.py).
+    Contains fields:
+        - content_type - 'menu' (menus and submenus), 'page', 'quiz' (quizzes, questions and answer options)
+          or 'user'
+        - version - amount of changes
+    """
+    __tablename__ = 'content_version'
+    content_type = db.Column(db.String(32), primary_key=True)
+    version = db.Column(db.Integer, default=0, nullable=False)
+
+    CONTENT_TYPES = ('menu', 'page', 'quiz', 'user')
+
+    @staticmethod
+    def bump(*content_types):
+        """
+        Method increments versions of content types in the current transaction (it has to be committed by caller).
+        :param content_types: names of content types
+        """
+        for content_type in content_types:
+            updated = ContentVersion.query.filter_by(content_type=content_type) \
+                .update({ContentVersion.version: ContentVersion.version + 1}, synchronize_session=False)
+            if not updated:
+                db.session.add(ContentVersion(content_type=content_type, version=1))
+
+    @staticmethod
+    def versions():
+        """
+        Method returns current versions of all content types.
+        :return: dict (content_type: version)
+        """
+        return dict(db.session.query(ContentVersion.content_type, ContentVersion.version))
@@ -0,0 +1,183 @@
+import codecs
+import csv
+import json
+from app import db
+from .content_version import content_changed
+from .models import Quiz, QuizQuestion, QuizAnswerOption
+from .quiz_schema import invalidate_quiz_schemas
+
+"""
+Contains import of a whole quiz (quiz, its questions and answer options in both languages) from a file.
+
+JSON file holds one quiz:
+    {"name": "...", "name_en": "...", "counter_stripes": 1,
+     "questions": [{"question": "...", "question_en": "...",
+                    "answers": [{"answer": "...", "answer_en": "..."}, ...]}, ...]}
+
+CSV file (with header) holds one answer option per row, columns: quiz, quiz_en, question, question_en, answer,
+answer_en. Quiz names may be given only in the first row, a row with empty question continues the previous question.
+"""
+
+CSV_COLUMNS = ('quiz', 'quiz_en', 'question', 'question_en', 'answer', 'answer_en')
+MAX_ERRORS = 20
+
+
+class QuizImportError(ValueError):
+    """
+    Class representing invalid import file. Field errors contains list of messages.
+    """
+
+    def __init__(self, errors):
+        ValueError.__init__(self, '; '.join(errors))
+        self.errors = errors
+
+
+class _Errors(list):
+
+    def add(self, message):
+        self.append(message)
+        if len(self) >= MAX_ERRORS:
+            raise QuizImportError(self)
+
+
+def _text(value, where, field, max_length, errors):
+    if not isinstance(value, str) or not value.strip():
+        errors.add('%s: %s is required' % (where, field))
+        return None
+    value = value.strip()
+    if max_length is not None and len(value) > max_length:
+        errors.add('%s: %s is longer than %d characters' % (where, field, max_length))
+    return value
+
+
+def read_json(stream):
+    """
+    Function reads and validates quiz from JSON file.
+    :param stream: binary file
+    :return: dict in format of JSON file (see module docs), stripped of unknown keys
+    """
+    try:
+        data = json.load(codecs.getreader('utf-8')(stream))
+    except ValueError as error:
+        raise QuizImportError(['Invalid JSON: %s' % error])
+    if not isinstance(data, dict) or not isinstance(data.get('questions'), list):
+        raise QuizImportError(['JSON has to be an object with list of questions'])
+    errors = _Errors()
+    quiz = {'name': _text(data.get('name'), 'quiz', 'name', 100, errors),
+            'name_en': _text(data.get('name_en'), 'quiz', 'name_en', 100, errors),
+            'counter_stripes': data.get('counter_stripes', 1),
+            'questions': []}
+    if not isinstance(quiz['counter_stripes'], int) or not 1 <= quiz['counter_stripes'] <= 64:
+        errors.add('quiz: counter_stripes has to be a number from 1 to 64')
+    for number, question in enumerate(data['questions'], 1):
+        where = 'question %d' % number
+        if not isinstance(question, dict) or not isinstance(question.get('answers'), list) or \
+                not question['answers']:
+            errors.add('%s: has to be an object with non-empty list of answers' % where)
+            continue
+        answers = []
+        for answer_number, answer in enumerate(question['answers'], 1):
+            answer_where = '%s answer %d' % (where, answer_number)
+            if not isinstance(answer, dict):
+                errors.add('%s: has to be an object' % answer_where)
+                continue
+            answers.append({'answer': _text(answer.get('answer'), answer_where, 'answer', None, errors),
+                            'answer_en': _text(answer.get('answer_en'), answer_where, 'answer_en', None, errors)})
+        quiz['questions'].append({'question': _text(question.get('question'), where, 'question', 255, errors),
+                                  'question_en': _text(question.get('question_en'), where, 'question_en', 255,
+                                                       errors),
+                                  'answers': answers})
+    if not quiz['questions']:
+        errors.add('quiz: has no questions')
+    if errors:
+        raise QuizImportError(errors)
+    return quiz
+
+
+def read_csv(stream):
+    """
+    Function reads and validates quiz from CSV file, row by row.
+    :param stream: binary file
+    :return: dict in format of JSON file (see module docs)
+    """
+    reader = csv.DictReader(codecs.getreader('utf-8-sig')(stream))
+    try:
+        missing = [column for column in CSV_COLUMNS if column not in (reader.fieldnames or ())]
+        if missing:
+            raise QuizImportError(['CSV has no columns: %s' % ', '.join(missing)])
+        errors = _Errors()
+        quiz = {'name': None, 'name_en': None, 'counter_stripes': 1, 'questions': []}
+        for row in reader:
+            where = 'line %d' % reader.line_num
+            for field, column, max_length in (('name', 'quiz', 100), ('name_en', 'quiz_en', 100)):
+                if row[column]:
+                    value = _text(row[column], where, column, max_length, errors)
+                    if quiz[field] is None:
+                        quiz[field] = value
+                    elif value != quiz[field]:
+                        errors.add('%s: file has to contain one quiz' % where)
+            if row['question'] or row['question_en'] or not quiz['questions']:
+                quiz['questions'].append({'question': _text(row['question'], where, 'question', 255, errors),
+                                          'question_en': _text(row['question_en'], where, 'question_en', 255, errors),
+                                          'answers': []})
+            quiz['questions'][-1]['answers'].append({'answer': _text(row['answer'], where, 'answer', None, errors),
+                                                     'answer_en': _text(row['answer_en'], where, 'answer_en', None,
+                                                                        errors)})
+        if quiz['name'] is None or quiz['name_en'] is None:
+            errors.add('quiz: name and name_en are required')
+        if not quiz['questions']:
+            errors.add('quiz: has no questions')
+        if errors:
+            raise QuizImportError(errors)
+    except (UnicodeDecodeError, csv.Error) as error:
+        raise QuizImportError(['Invalid CSV: %s' % error])
+    return quiz
+
+
+def read_quiz(stream, filename):
+    """
+    Function reads and validates quiz from JSON or CSV file (chosen by extension of filename).
+    :param stream: binary file
+    :param filename: name of the file
+    :return: dict in format of JSON file (see module docs)
+    """
+    if filename.lower().endswith('.json'):
+        return read_json(stream)
+    if filename.lower().endswith('.csv'):
+        return read_csv(stream)
+    raise QuizImportError(['File has to be .json or .csv'])
+
+
+def import_quiz(quiz):
+    """
+    Function saves quiz read by read_quiz() in one transaction: the quiz, then all questions with one bulk insert
+    and all answer options with one more.
+    :param quiz: dict in format of JSON file (see module docs)
+    :return: ID of the new Quiz
+    """
+    try:
+        new_quiz = Quiz(name=quiz['name'], name_en=quiz['name_en'], counter_stripes=quiz['counter_stripes'])
+        db.session.add(new_quiz)
+        db.session.flush()
+        quiz_id = new_quiz.id
+        db.session.execute(QuizQuestion.__table__.insert(),
+                           [{'question': question['question'],
+                             'question_en': question['question_en'],
+                             'quiz_id': quiz_id} for question in quiz['questions']])
+        # Questions of the new quiz got increasing IDs in order of insertion.
+        question_ids = [question_id for question_id, in db.session.query(QuizQuestion.id)
+                        .filter(QuizQuestion.quiz_id == quiz_id)
+                        .order_by(QuizQuestion.id)]
+        db.session.execute(QuizAnswerOption.__table__.insert(),
+                           [{'answer': answer['answer'],
+                             'answer_en': answer['answer_en'],
+                             'quiz_question_id': question_id}
+                            for question_id, question in zip(question_ids, quiz['questions'])
+                            for answer in question['answers']])
+        content_changed('quiz')
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    invalidate_quiz_schemas()
+    return quiz_id
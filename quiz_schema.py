@@ -0,0 +1,90 @@
+from app import db
+from .cache import cache
+from .models import Quiz, QuizQuestion, QuizAnswerOption
+
+"""
+Contains in-memory schemas of quizzes used to validate submitted quiz forms.
+Schema of a quiz is built with one query and cached, so checking a submission doesn't touch the database at all.
+"""
+
+
+class QuizSchema(object):
+    """
+    Class representing structure of a quiz.
+    Contains fields:
+        - quiz_id - ID of the Quiz
+        - stripes - Quiz.counter_stripes
+        - questions - list of tuples (QuizQuestion.id, frozenset of its QuizAnswerOption IDs), ordered by ID
+    """
+
+    def __init__(self, quiz_id, stripes, questions):
+        self.quiz_id = quiz_id
+        self.stripes = stripes
+        self.questions = questions
+
+    @staticmethod
+    def load(quiz):
+        """
+        Method builds schema of a quiz.
+        :param quiz: Quiz
+        :return: QuizSchema
+        """
+        options = {}
+        rows = db.session.query(QuizQuestion.id, QuizAnswerOption.id) \
+            .outerjoin(QuizAnswerOption, QuizAnswerOption.quiz_question_id == QuizQuestion.id) \
+            .filter(QuizQuestion.quiz_id == quiz.id)
+        for question_id, option_id in rows:
+            options.setdefault(question_id, set())
+            if option_id is not None:
+                options[question_id].add(option_id)
+        return QuizSchema(quiz.id,
+                          quiz.counter_stripes or 1,
+                          [(question_id, frozenset(options[question_id])) for question_id in sorted(options)])
+
+    def validate(self, form):
+        """
+        Method checks submitted quiz form: it has to contain exactly one answer for every question
+        (key - ID of question, value - ID of answer option of that question) and nothing else.
+        :param form: dict-like, e.g. request.form
+        :return: list of chosen QuizAnswerOption IDs in order of questions, None if form is invalid
+        """
+        if len(form) != len(self.questions):
+            return None
+        options = []
+        for question_id, question_options in self.questions:
+            try:
+                option_id = int(form[str(question_id)])
+            except (KeyError, ValueError):
+                return None
+            if option_id not in question_options:
+                return None
+            options.append(option_id)
+        return options
+
+
+def quiz_schema(name):
+    """
+    Function returns cached schema of Quiz with name (or ID if there's no Quiz with such name) specified in parameter.
+    :param name: Quiz name or ID
+    :return: QuizSchema or None if there's no such quiz
+    """
+    key = 'quiz_schema:%s' % name
+    schema = cache.get(key)
+    if schema is None:
+        # Loaded from the primary like other cached content (see content_version.py).
+        with db.session.primary_reads():
+            quiz = Quiz.query.filter_by(name=name).first()
+            if quiz is None:
+                quiz = Quiz.query.filter_by(id=name).first()
+                if quiz is None:
+                    return None
+            schema = QuizSchema.load(quiz)
+        cache.set(key, schema)
+    return schema
+
+
+def invalidate_quiz_schemas():
+    """
+    Function drops all cached quiz schemas. It has to be called after any change of quizzes, questions or answers.
+    """
+    cache.delete_namespace('quiz_schema')
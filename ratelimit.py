@@ -0,0 +1,123 @@
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+from app import app
+
+"""
+Contains in-process admission checks of quiz submissions:
+    - TokenBucketLimiter - limits how often one client (IP address) can submit quizzes
+    - RotatingBloomFilter - remembers which browser already filled which quiz
+Both keep bounded amount of memory no matter how many clients there are and answer in microseconds.
+"""
+
+
+class TokenBucketLimiter(object):
+    """
+    Class representing token bucket rate limiter keyed by client.
+    Every client gets a bucket of `burst` tokens refilled with `rate` tokens per second, every request takes one token.
+    Buckets are split into shards with their own locks, so concurrent requests rarely wait for each other.
+    Every shard keeps at most `max_clients / shards` buckets - the least recently seen are dropped first
+    (a dropped client simply starts again with a full bucket).
+    """
+
+    def __init__(self, rate, burst, shards=64, max_clients=1000000):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.max_per_shard = max(1, max_clients // shards)
+        self._shards = [(threading.Lock(), OrderedDict()) for _ in range(shards)]
+
+    def allow(self, client):
+        """
+        Method takes one token from bucket of the client.
+        :param client: string, e.g. IP address
+        :return: tuple (boolean - request is allowed, seconds until next token)
+        """
+        lock, buckets = self._shards[hash(client) % len(self._shards)]
+        now = time.time()
+        with lock:
+            tokens, updated = buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            buckets[client] = (tokens, now)
+            if len(buckets) > self.max_per_shard:
+                buckets.popitem(last=False)
+        return allowed, 0 if allowed else (1 - tokens) / self.rate
+
+
+class BloomFilter(object):
+    """
+    Class representing Bloom filter - set which may answer "probably contains" for a key that was never added
+    (with probability error_rate when it holds `capacity` keys), but never misses a key that was added.
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.hashes = max(1, int(round(self.size / float(capacity) * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+
+class RotatingBloomFilter(object):
+    """
+    Class representing Bloom filter that forgets old keys.
+    Keys are added to the current filter and looked up in the current and the previous one. When the current filter
+    is full (capacity keys) or older than `rotation` seconds, it becomes the previous one and a new empty filter
+    is started. So a key is remembered for at least one rotation period and memory is bounded by two filters.
+    """
+
+    def __init__(self, capacity, error_rate, rotation):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.rotation = rotation
+        self._lock = threading.Lock()
+        self._previous = BloomFilter(capacity, error_rate)
+        self._current = BloomFilter(capacity, error_rate)
+        self._started = time.time()
+
+    def _rotate(self):
+        if self._current.count >= self.capacity or time.time() - self._started > self.rotation:
+            self._previous = self._current
+            self._current = BloomFilter(self.capacity, self.error_rate)
+            self._started = time.time()
+
+    def __contains__(self, key):
+        with self._lock:
+            self._rotate()
+            return key in self._current or key in self._previous
+
+    def add(self, key):
+        """
+        Method adds key to the filter (e.g. after the action it guards has succeeded).
+        :param key: string
+        """
+        with self._lock:
+            self._rotate()
+            if key not in self._current and key not in self._previous:
+                self._current.add(key)
+
+
+quiz_rate_limiter = TokenBucketLimiter(app.config['QUIZ_RATE_LIMIT'],
+                                       app.config['QUIZ_RATE_BURST'],
+                                       app.config['QUIZ_RATE_LIMIT_SHARDS'],
+                                       app.config['QUIZ_RATE_LIMIT_CLIENTS'])
+quiz_voters = RotatingBloomFilter(app.config['QUIZ_DUPLICATE_FILTER_CAPACITY'],
+                                  app.config['QUIZ_DUPLICATE_FILTER_ERROR_RATE'],
+                                  app.config['QUIZ_DUPLICATE_FILTER_ROTATION'])
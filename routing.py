@@ -0,0 +1,209 @@
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from flask import has_request_context, request
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import create_engine, orm, text
+from sqlalchemy.pool import NullPool
+from sqlalchemy.sql.expression import UpdateBase
+
+"""
+Contains routing of database queries between the primary database and read replicas.
+Reads of a request go to a replica (SQLite copy kept in sync by database_replicate.py, or PostgreSQL standby),
+writes go to the primary. Once a request has written anything, the rest of it reads from the primary as well,
+and so do requests of the same browser for the next REPLICA_MAX_STALENESS seconds (cookie), so users always
+see their own changes. Replica which is older than REPLICA_MAX_STALENESS is not used. All reads of a session
+go to the same replica, so a request never mixes data of replicas lagging by different amounts.
+Sessions outside of requests (scripts, ingestion and compaction workers) always use the primary - they read
+data they're going to update.
+"""
+
+PRIMARY_COOKIE = 'db_primary_until'
+
+
+class ReplicaSet(object):
+    """
+    Class representing read replicas of the database.
+    Engines are created on first use. Staleness of every replica is checked at most once per `check_interval`
+    seconds: SQLite replica is as old as its file (it's replaced as a whole by sync_sqlite_replica()),
+    PostgreSQL standby reports time of the last replayed transaction.
+    """
+
+    def __init__(self):
+        self.uris = []
+        self.max_staleness = 0
+        self.check_interval = 1
+        self.engine_options = {}
+        self._engines = None
+        self._fresh = {}
+        self._lock = threading.Lock()
+
+    def configure(self, app):
+        self.uris = app.config['SQLALCHEMY_REPLICA_URIS']
+        self.max_staleness = app.config['REPLICA_MAX_STALENESS']
+        self.check_interval = app.config['REPLICA_CHECK_INTERVAL']
+        self.engine_options = app.config['SQLALCHEMY_ENGINE_OPTIONS']
+
+    def engines(self):
+        if self._engines is None:
+            with self._lock:
+                if self._engines is None:
+                    self._engines = [self._create_engine(uri) for uri in self.uris]
+        return self._engines
+
+    def _create_engine(self, uri):
+        if uri.startswith('sqlite:'):
+            # Replica file is replaced on every sync, pooled connections would keep reading the old one.
+            return create_engine(uri, poolclass=NullPool)
+        return create_engine(uri, **self.engine_options)
+
+    def staleness(self, engine):
+        """
+        Method returns how many seconds of changes the replica may miss.
+        :param engine: replica engine
+        :return: float
+        """
+        if engine.dialect.name == 'sqlite':
+            path = engine.url.database
+            return time.time() - os.path.getmtime(path) if os.path.exists(path) else float('inf')
+        lag = engine.execute(text('SELECT EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())')).scalar()
+        return float(lag or 0)
+
+    def is_fresh(self, engine):
+        checked, fresh = self._fresh.get(engine, (0, False))
+        if time.time() - checked > self.check_interval:
+            try:
+                fresh = self.staleness(engine) <= self.max_staleness
+            except Exception:
+                fresh = False
+            self._fresh[engine] = (time.time(), fresh)
+        return fresh
+
+    def choose(self):
+        """
+        Method returns random replica which is fresh enough.
+        :return: engine or None if there's no such replica
+        """
+        engines = [engine for engine in self.engines() if self.is_fresh(engine)]
+        return random.choice(engines) if engines else None
+
+
+replicas = ReplicaSet()
+
+
+class RoutingSession(SignallingSession):
+    """
+    Class representing database session which sends reads to replicas.
+    Primary database is used for:
+        - sessions outside of a request
+        - writes (flush, INSERT / UPDATE / DELETE statements)
+        - every query after the first write in the session (one session lives for one request)
+        - every query of a request whose browser has written recently (see PRIMARY_COOKIE)
+        - queries inside of primary_reads() block
+        - models with their own bind (__bind_key__)
+    """
+
+    def __init__(self, *args, **kwargs):
+        SignallingSession.__init__(self, *args, **kwargs)
+        self.wrote = False
+        self._primary_reads = 0
+        self._replica = None
+
+    def use_primary(self):
+        """
+        Method makes the rest of the session use the primary database (e.g. before reading data that will be
+        updated).
+        """
+        self.wrote = True
+
+    @contextmanager
+    def primary_reads(self):
+        """
+        Method makes queries inside of the block read from the primary database, without moving the rest
+        of the session to it (e.g. loading of content cached for all requests).
+        """
+        self._primary_reads += 1
+        try:
+            yield
+        finally:
+            self._primary_reads -= 1
+
+    def get_bind(self, mapper=None, clause=None):
+        if isinstance(clause, UpdateBase) or self._flushing:
+            self.wrote = True
+        if self.wrote or self._primary_reads or not replicas.uris or not has_request_context() or recently_wrote() or \
+                (mapper is not None and mapper.persist_selectable.info.get('bind_key')):
+            return SignallingSession.get_bind(self, mapper, clause)
+        if self._replica is None:
+            self._replica = replicas.choose() or False
+        return self._replica or SignallingSession.get_bind(self, mapper, clause)
+
+
+def recently_wrote():
+    """
+    Function checks if browser of the current request has written to the database recently (see PRIMARY_COOKIE).
+    Malformed cookie counts as no recent write.
+    :return: boolean
+    """
+    try:
+        return float(request.cookies.get(PRIMARY_COOKIE) or 0) > time.time()
+    except ValueError:
+        return False
+
+
+class RoutingScopedSession(orm.scoped_session):
+    """
+    Class representing scoped session of RoutingSession, with its use_primary() and primary_reads() methods
+    (e.g. db.session.use_primary()).
+    """
+
+    def use_primary(self):
+        self.registry().use_primary()
+
+    def primary_reads(self):
+        return self.registry().primary_reads()
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """
+    Class representing Flask-SQLAlchemy extension using RoutingSession.
+    """
+
+    def create_scoped_session(self, options=None):
+        session = SQLAlchemy.create_scoped_session(self, options)
+        return RoutingScopedSession(session.session_factory, scopefunc=session.registry.scopefunc)
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def init_app(self, app):
+        SQLAlchemy.init_app(self, app)
+        replicas.configure(app)
+
+        @app.after_request
+        def remember_write(response):
+            if replicas.uris and self.session.registry.has() and self.session().wrote:
+                response.set_cookie(PRIMARY_COOKIE, str(time.time() + replicas.max_staleness),
+                                    max_age=int(replicas.max_staleness) + 1, httponly=True)
+            return response
+
+
+def sync_sqlite_replica(primary, replica):
+    """
+    Function copies primary SQLite database to replica file with the online backup API.
+    Copy is written to a temporary file and moved in place at once, so readers never see half of it.
+    :param primary: path of primary database file
+    :param replica: path of replica file
+    """
+    temporary = replica + '.sync'
+    source = sqlite3.connect(primary)
+    target = sqlite3.connect(temporary)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+    os.replace(temporary, replica)
@@ -0,0 +1,6 @@
+#!flask/bin/python
+from app import app
+from app.templating import precompile
+
+names = precompile(app)
+print('Compiled templates: ' + str(len(names)) + ' (cache: ' + str(app.config['TEMPLATE_CACHE_DIR']) + ')')
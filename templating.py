@@ -0,0 +1,94 @@
+import os
+import tempfile
+from jinja2 import FileSystemBytecodeCache
+
+"""
+Contains compilation of templates ahead of requests.
+Compiled templates are kept in TEMPLATE_CACHE_DIR (bytecode cache of Jinja), shared by all workers and kept between
+deploys - a template is compiled again only when its source changes. templates_precompile.py fills the cache at build
+time, TEMPLATE_WARMUP loads (and renders) all templates in every worker before it gets its first request (wsgi.py).
+"""
+
+
+class AtomicBytecodeCache(FileSystemBytecodeCache):
+    """
+    Class representing bytecode cache of Jinja in a directory written by many processes: every file is written
+    to a temporary file and renamed, so other workers never read a partly written one.
+    """
+
+    def __init__(self, directory):
+        if not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+        FileSystemBytecodeCache.__init__(self, directory)
+
+    def dump_bytecode(self, bucket):
+        fd, path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                bucket.write_bytecode(f)
+            os.replace(path, self._get_cache_filename(bucket))
+        except Exception:
+            os.unlink(path)
+            raise
+
+
+def init_templates(app):
+    """
+    Function sets bytecode cache of templates. It has to be called before the template environment is used.
+    :param app: Flask application
+    """
+    if app.config['TEMPLATE_CACHE_DIR']:
+        app.jinja_options = dict(app.jinja_options,
+                                 bytecode_cache=AtomicBytecodeCache(app.config['TEMPLATE_CACHE_DIR']))
+
+
+def precompile(app):
+    """
+    Function compiles all templates (and stores them in bytecode cache).
+    :param app: Flask application
+    :return: list of names of templates
+    """
+    names = app.jinja_env.list_templates(extensions=['html'])
+    for name in names:
+        app.jinja_env.get_template(name)
+    return names
+
+
+def sample_paths(app):
+    """
+    Function finds paths of one page and one quiz (with its trend) from the database, so the templates and views
+    of content are rendered with real data by warm_up().
+    :param app: Flask application
+    :return: list of paths
+    """
+    # Models import the application, which imports this module.
+    from .models import Page, Quiz
+    from app import db
+    paths = []
+    with app.app_context():
+        page = db.session.query(Page.id).order_by(Page.id).first()
+        if page is not None:
+            paths.append('/page/%d' % page.id)
+        quiz = db.session.query(Quiz.id).order_by(Quiz.id).first()
+        if quiz is not None:
+            paths += ['/quiz/%d' % quiz.id, '/quiz/%d/trend' % quiz.id]
+        db.session.remove()
+    return paths
+
+
+def warm_up(app, paths):
+    """
+    Function compiles all templates (see precompile()) and renders public pages with real data once (through test
+    client, as anonymous user of every language): given paths and a page and a quiz from the database
+    (see sample_paths()), so the first request of the worker doesn't compile or load anything.
+    Templates of the admin panel can't be rendered anonymously, they're only compiled and loaded.
+    :param app: Flask application
+    :param paths: paths of pages to render
+    """
+    precompile(app)
+    paths = list(paths) + sample_paths(app)
+    for language in app.config['LANG_CONSTS']:
+        client = app.test_client()
+        client.get('/index/' + language)
+        for path in paths:
+            client.get(path)
@@ -0,0 +1,40 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+"""
+Contains test of the time of importing the application - every worker and script pays it at start.
+Budget can be changed with IMPORT_TIME_BUDGET environment variable (seconds) for slow machines.
+"""
+
+IMPORT_TIME_BUDGET = float(os.environ.get('IMPORT_TIME_BUDGET', 1.0))
+# Libraries loaded only by requests which use them (see lazy.py)
+LAZY_MODULES = ('flask_openid', 'wtforms')
+
+IMPORT_SCRIPT = '''
+import json, sys, time
+sys.path.insert(0, %r)
+start = time.perf_counter()
+import support
+support.load_app()
+print(json.dumps({'seconds': time.perf_counter() - start,
+                  'loaded': [name for name in %r if name in sys.modules]}))
+'''
+
+
+class ImportTimeTest(unittest.TestCase):
+    def test_import_time(self):
+        environment = dict(os.environ)
+        for name in ('CACHE_WARMUP', 'TEMPLATE_WARMUP'):
+            environment.pop(name, None)
+        script = IMPORT_SCRIPT % (os.path.dirname(os.path.abspath(__file__)), LAZY_MODULES)
+        output = subprocess.check_output([sys.executable, '-c', script], env=environment)
+        result = json.loads(output.decode().strip().splitlines()[-1])
+        self.assertEqual(result['loaded'], [])
+        self.assertLess(result['seconds'], IMPORT_TIME_BUDGET)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,21 +1,45 @@
 # coding=utf-8
 import datetime
-from flask import render_template, flash, redirect, session, url_for, request, g
+import hmac
+import uuid
+from collections import Counter
+from flask import render_template, flash, redirect, session, url_for, request, g, jsonify, \
+    make_response
 from flask_login import login_user, logout_user, current_user, login_required
+from itsdangerous import BadSignature, Signer
+from sqlalchemy.orm import make_transient_to_detached
 from app import app, db, lm, oid
-from .forms import LoginForm, UserForm, MenuForm, PageForm, SubmenuForm, QuizForm, QuizQuestionForm, \
-    QuizAnswerOptionForm
-from .models import User, Menu, Page, Submenu, Quiz, QuizQuestion, QuizAnswerOption, QuizUserAnswer
+from .models import User, Menu, Page, Submenu, Quiz, QuizQuestion, QuizAnswerOption, QuizSubmission, \
+    QuizVoteBucket, delete_votes
+from .cache import cache, get_or_set
+from .quiz_schema import quiz_schema, invalidate_quiz_schemas
+from .content_version import content_changed, check_content_versions, load_from_primary
+from .fragment_cache import FragmentCacheExtension
+from .quiz_import import read_quiz, import_quiz, QuizImportError
+from .bulk_admin import BULK_ENTITIES, bulk_action, bulk_context
+from .ratelimit import quiz_rate_limiter, quiz_voters
+from .admission import write_gate
+from .votelog import vote_log
+from .lazy import lazy_import
 
 """
 This is main application controller.
 It connects Models with Templates (MVT architecture of application).
 """
 
+# Forms (and WTForms) are loaded on first use - most requests don't need them.
+forms = lazy_import('app.forms')
+
+app.jinja_env.add_extension(FragmentCacheExtension)
+
+# Cookie identifying a browser which fills quizzes is signed, so it can't be replaced by any made up value.
+voter_signer = Signer(app.config['SECRET_KEY'], salt='quiz-voter')
+
 
 @app.before_request
 def before_request():
     g.user = current_user
+    check_content_versions()
 
 
 @app.route('/')
@@ -29,14 +53,15 @@ def index():
     """
     if 'lang' not in session:
         return render_template('lang.html')
-    page = Page.query.filter_by(link="index").first()
+    page = cached_page('index', by_id=False)
     user = g.user
-    menu = Menu.query.order_by(Menu.sequence).all()
-    return render_template('index.html',
-                           user=user,
-                           menu=menu,
-                           const=app.config['LANG_CONSTS'],
-                           page=page)
+    menu = navigation()
+    return render_cached('index',
+                         'index.html',
+                         user=user,
+                         menu=menu,
+                         const=app.config['LANG_CONSTS'],
+                         page=page)
 
 
 @app.route('/index/<language>')
@@ -50,7 +75,7 @@ def lang(language):
     return redirect(url_for('index'))
 
 
-@app.route('/login', Functions=['GET', 'POST'])
+@app.route('/login', methods=['GET', 'POST'])
 @oid.loginhandler
 def login():
     """
@@ -63,7 +88,7 @@ def login():
     """
     if g.user is not None and g.user.is_authenticated:
         return redirect(url_for('index'))
-    form = LoginForm()
+    form = forms.LoginForm()
     if form.validate_on_submit():
         session['remember_me'] = form.remember_me.data
         return oid.try_login(form.openid.data, ask_for=['nickname', 'email'])
@@ -118,19 +143,18 @@ def show_page(index):
     :param index: link or ID of page
     :return: HTML page
     """
-    menu = Menu.query.order_by(Menu.sequence).all()
-    page = Page.query.filter_by(link=index).first()
+    menu = navigation()
+    page = cached_page(index)
 
     if page is None:
-        page = Page.query.filter_by(id=index).first()
-        if page is None:
-            return render_template('404.html',
-                                   const=app.config['LANG_CONSTS']), 404
+        return render_template('404.html',
+                               const=app.config['LANG_CONSTS']), 404
 
-    return render_template('page.html',
-                           menu=menu,
-                           page=page,
-                           const=app.config['LANG_CONSTS'])
+    return render_cached('page:%s' % page['id'],
+                         'page.html',
+                         menu=menu,
+                         page=page,
+                         const=app.config['LANG_CONSTS'])
 
 
 @app.route('/user/<nickname>')
@@ -143,7 +167,7 @@ def user(nickname):
     :return: HTML page
     """
     user_ = User.query.filter_by(nickname=nickname).first()
-    menu = Menu.query.order_by(Menu.sequence).all()
+    menu = navigation()
     if user_ is None:
         flash('User %s not found.' % nickname)
         return redirect(url_for('index'))
@@ -153,7 +177,7 @@ def user(nickname):
                            menu=menu)
 
 
-@app.route('/user/edit', Functions=['GET', 'POST'])
+@app.route('/user/edit', methods=['GET', 'POST'])
 @login_required
 def user_edit():
     """
@@ -162,12 +186,14 @@ def user_edit():
     If not - prepares page that contains filled UserForm with current data.
     :return: HTML page
     """
-    menu = Menu.query.order_by(Menu.sequence).all()
-    form = UserForm(g.user.nickname)
+    menu = navigation()
+    form = forms.UserForm(g.user.nickname)
     if form.validate_on_submit():
         g.user.nickname = form.nickname.data
         db.session.add(g.user)
+        content_changed('user')
         db.session.commit()
+        cache.delete('user:%s' % g.user.id)
         flash('Your changes have been saved.')
         return redirect(url_for('user_edit'))
     else:
@@ -178,7 +204,7 @@ def user_edit():
                            const=app.config['LANG_CONSTS'])
 
 
-@app.route('/admin/menu', Functions=['GET', 'POST'])
+@app.route('/admin/menu', methods=['GET', 'POST'])
 @login_required
 def add_menu():
     """
@@ -187,7 +213,7 @@ def add_menu():
     If not - page is prepared again, with pre-filled form and errors due to which validation didn't pass through.
     :return: HTML page 
     """
-    form = MenuForm()
+    form = forms.MenuForm()
     menu = Menu.query.order_by(Menu.sequence).all()
     if form.validate_on_submit():
         menu = Menu(sequence=form.sequence.data,
@@ -196,17 +222,19 @@ def add_menu():
                     caption=form.caption.data,
                     caption_en=form.caption_en.data)
         db.session.add(menu)
+        content_changed('menu')
         db.session.commit()
         flash('Your successfully added a menu element.')
         return redirect(url_for('add_menu'))
     return render_template('menu_edit.html',
                            form=form,
+                           bulk=bulk_context('menu'),
                            menu=menu,
                            const=app.config['LANG_CONSTS'],
                            css_name='css/edit.css')
 
 
-@app.route('/admin/menu/edit/<index>', Functions=['GET', 'POST'])
+@app.route('/admin/menu/edit/<index>', methods=['GET', 'POST'])
 @login_required
 def edit_menu(index):
     """
@@ -225,11 +253,11 @@ def edit_menu(index):
         flash('There is no menu with such ID.')
         return redirect(url_for('add_menu'))
 
-    form = MenuForm(sequence=edited_menu.sequence,
-                    link=edited_menu.link,
-                    type=edited_menu.type,
-                    caption=edited_menu.caption,
-                    caption_en=edited_menu.caption_en)
+    form = forms.MenuForm(sequence=edited_menu.sequence,
+                          link=edited_menu.link,
+                          type=edited_menu.type,
+                          caption=edited_menu.caption,
+                          caption_en=edited_menu.caption_en)
 
     if form.validate_on_submit():
         edited_menu.sequence = form.sequence.data
@@ -238,17 +266,19 @@ def edit_menu(index):
         edited_menu.caption = form.caption.data
         edited_menu.caption_en = form.caption_en.data
 
+        content_changed('menu')
         db.session.commit()
         flash('Your changes have been saved.')
         return redirect(url_for('add_menu'))
     return render_template('menu_edit.html',
                            form=form,
+                           bulk=bulk_context('menu'),
                            menu=menu,
                            const=app.config['LANG_CONSTS'],
                            css_name='css/edit.css')
 
 
-@app.route('/admin/menu/delete/<index>', Functions=['GET', 'POST'])
+@app.route('/admin/menu/delete/<index>', methods=['GET', 'POST'])
 @login_required
 def delete_menu(index):
     """
@@ -261,12 +291,23 @@ def delete_menu(index):
     menu_to_delete = Menu.query.filter_by(id=index).first()
     if menu_to_delete is not None:
         db.session.delete(menu_to_delete)
+        content_changed('menu')
         db.session.commit()
         flash('You have successfully deleted an menu item.')
     return redirect(url_for('add_menu'))
 
 
-@app.route('/admin/page', Functions=['GET', 'POST'])
+@app.route('/admin/menu/reorder', methods=['POST'])
+@login_required
+def reorder_menu():
+    """
+    Function sets order of all Menus at once (one transaction, one invalidation of navigation).
+    :return: JSON with IDs of menus in the new order, or with error (HTTP 400)
+    """
+    return apply_order(forms.ReorderForm(), Menu.reorder, 'menu')
+
+
+@app.route('/admin/page', methods=['GET', 'POST'])
 @login_required
 def add_page():
     """
@@ -275,7 +316,7 @@ def add_page():
     If not - page is prepared again, with pre-filled form and errors due to which validation didn't pass through.
     :return: HTML page 
     """
-    form = PageForm()
+    form = forms.PageForm()
     menu = Menu.query.order_by(Menu.sequence).all()
     pages_to_display = Page.query
     if form.validate_on_submit():
@@ -286,18 +327,20 @@ def add_page():
                     content_en=form.content_en.data,
                     img_name=form.img_name.data)
         db.session.add(page)
+        content_changed('page')
         db.session.commit()
         flash('You have successfully added a page element.')
         return redirect(url_for('add_page'))
     return render_template('page_edit.html',
                            form=form,
+                           bulk=bulk_context('page'),
                            menu=menu,
                            page=pages_to_display,
                            const=app.config['LANG_CONSTS'],
                            css_name='css/edit.css')
 
 
-@app.route('/admin/page/edit/<index>', Functions=['GET', 'POST'])
+@app.route('/admin/page/edit/<index>', methods=['GET', 'POST'])
 @login_required
 def edit_page(index):
     """
@@ -316,12 +359,12 @@ def edit_page(index):
         flash('There is no page with such ID.')
         return redirect(url_for('add_menu'))
 
-    form = PageForm(link=edited_page.link,
-                    title=edited_page.title,
-                    title_en=edited_page.title_en,
-                    content=edited_page.content,
-                    content_en=edited_page.content_en,
-                    img_name=edited_page.img_name)
+    form = forms.PageForm(link=edited_page.link,
+                          title=edited_page.title,
+                          title_en=edited_page.title_en,
+                          content=edited_page.content,
+                          content_en=edited_page.content_en,
+                          img_name=edited_page.img_name)
 
     if form.validate_on_submit():
         edited_page.link = form.link.data
@@ -331,19 +374,21 @@ def edit_page(index):
         edited_page.content_en = form.content_en.data
         edited_page.img_name = form.img_name.data
 
+        content_changed('page')
         db.session.commit()
         flash('Your changes have been saved.')
         return redirect(url_for('add_page'))
     pages = Page.query.all()
     return render_template('page_edit.html',
                            form=form,
+                           bulk=bulk_context('page'),
                            menu=menu,
                            page=pages,
                            const=app.config['LANG_CONSTS'],
                            css_name='css/edit.css')
 
 
-@app.route('/admin/page/delete/<index>', Functions=['GET', 'POST'])
+@app.route('/admin/page/delete/<index>', methods=['GET', 'POST'])
 @login_required
 def delete_page(index):
     """
@@ -356,12 +401,13 @@ def delete_page(index):
     page_to_delete = Page.query.filter_by(id=index).first()
     if page_to_delete is not None:
         db.session.delete(page_to_delete)
+        content_changed('page')
         db.session.commit()
     flash('You have successfully deleted a page item.')
     return redirect(url_for('add_page'))
 
 
-@app.route('/admin/submenu', Functions=['GET', 'POST'])
+@app.route('/admin/submenu', methods=['GET', 'POST'])
 @login_required
 def add_submenu():
     """
@@ -370,7 +416,7 @@ def add_submenu():
     If not - page is prepared again, with pre-filled form and errors due to which validation didn't pass through.
     :return: HTML page 
     """
-    form = SubmenuForm()
+    form = forms.SubmenuForm()
     menu = Menu.query.order_by(Menu.sequence).all()
     submenus_to_display = Submenu.query.all()
     if form.validate_on_submit():
@@ -380,18 +426,20 @@ def add_submenu():
                           caption_en=form.caption_en.data,
                           menu=form.menu.data)
         db.session.add(submenu)
+        content_changed('menu')
         db.session.commit()
         flash('You have successfully added a submenu element.')
         return redirect(url_for('add_submenu'))
     return render_template('submenu_edit.html',
                            form=form,
+                           bulk=bulk_context('submenu'),
                            menu=menu,
                            submenu=submenus_to_display,
                            const=app.config['LANG_CONSTS'],
                            css_name='css/edit.css')
 
 
-@app.route('/admin/submenu/edit/<index>', Functions=['GET', 'POST'])
+@app.route('/admin/submenu/edit/<index>', methods=['GET', 'POST'])
 @login_required
 def edit_submenu(index):
     """
@@ -409,11 +457,11 @@ def edit_submenu(index):
     if edited_submenu is None:
         flash('There is no submenu with such ID.')
         return redirect(url_for('add_submenu'))
-    form = SubmenuForm(sequence=edited_submenu.sequence,
-                       link=edited_submenu.link,
-                       caption=edited_submenu.caption,
-                       caption_en=edited_submenu.caption_en,
-                       menu=edited_submenu.menu)
+    form = forms.SubmenuForm(sequence=edited_submenu.sequence,
+                             link=edited_submenu.link,
+                             caption=edited_submenu.caption,
+                             caption_en=edited_submenu.caption_en,
+                             menu=edited_submenu.menu)
     if form.validate_on_submit():
         edited_submenu.sequence = form.sequence.data
         edited_submenu.link = form.link.data
@@ -421,18 +469,20 @@ def edit_submenu(index):
         edited_submenu.caption_en = form.caption_en.data
         edited_submenu.menu = form.menu.data
 
+        content_changed('menu')
         db.session.commit()
         flash('Your changes have been saved.')
         return redirect(url_for('add_submenu'))
     return render_template('submenu_edit.html',
                            form=form,
+                           bulk=bulk_context('submenu'),
                            menu=menu,
                            submenu=submenus_to_display,
                            const=app.config['LANG_CONSTS'],
                            css_name='css/edit.css')
 
 
-@app.route('/admin/submenu/delete/<index>', Functions=['GET', 'POST'])
+@app.route('/admin/submenu/delete/<index>', methods=['GET', 'POST'])
 @login_required
 def delete_submenu(index):
     """
@@ -445,12 +495,49 @@ def delete_submenu(index):
     submenu_to_delete = Submenu.query.filter_by(id=index).first()
     if submenu_to_delete is not None:
         db.session.delete(submenu_to_delete)
+        content_changed('menu')
         db.session.commit()
     flash('You have successfully deleted a submenu item.')
     return redirect(url_for('add_submenu'))
 
 
-@app.route('/admin/quiz', Functions=['GET', 'POST'])
+@app.route('/admin/submenu/reorder/<menu_id>', methods=['POST'])
+@login_required
+def reorder_submenu(menu_id):
+    """
+    Function sets order of all Submenus of Menu with ID specified in parameter at once
+    (one transaction, one invalidation of navigation).
+    :param menu_id: ID of menu
+    :return: JSON with IDs of submenus in the new order, or with error (HTTP 400)
+    """
+    return apply_order(forms.ReorderForm(), lambda ids: Submenu.reorder(menu_id, ids), 'menu')
+
+
+def apply_order(form, set_order, content_type):
+    """
+    Function validates ReorderForm and applies the new order with set_order in one transaction.
+    :param form: ReorderForm
+    :param set_order: function setting order of elements (from list of IDs)
+    :param content_type: type of content which cache is invalidated
+    :return: JSON response
+    """
+    if not form.validate_on_submit():
+        return jsonify(error='Order of elements is required.'), 400
+    try:
+        ids = [int(row_id) for row_id in form.ids.data.split(',')]
+    except ValueError:
+        return jsonify(error='IDs of elements have to be numbers separated by commas.'), 400
+    try:
+        set_order(ids)
+        content_changed(content_type)
+        db.session.commit()
+    except ValueError as error:
+        db.session.rollback()
+        return jsonify(error=str(error)), 400
+    return jsonify(ids=ids)
+
+
+@app.route('/admin/quiz', methods=['GET', 'POST'])
 @login_required
 def add_quiz():
     """
@@ -459,25 +546,29 @@ def add_quiz():
     If not - page is prepared again, with pre-filled form and errors due to which validation didn't pass through.
     :return: HTML page 
     """
-    form = QuizForm()
+    form = forms.QuizForm()
     menu = Menu.query.order_by(Menu.sequence).all()
     quizzes_to_display = Quiz.query.all()
     if form.validate_on_submit():
         quiz = Quiz(name=form.name.data,
-                    name_en=form.name_en.data)
+                    name_en=form.name_en.data,
+                    counter_stripes=form.counter_stripes.data)
         db.session.add(quiz)
+        content_changed('quiz')
         db.session.commit()
         flash('You have successfully added a quiz element.')
         return redirect(url_for('add_quiz'))
     return render_template('quiz_edit.html',
                            form=form,
+                           import_form=forms.QuizImportForm(),
+                           bulk=bulk_context('quiz'),
                            menu=menu,
                            quiz=quizzes_to_display,
                            const=app.config['LANG_CONSTS'],
                            css_name='css/edit.css')
 
 
-@app.route('/admin/quiz/edit/<index>', Functions=['GET', 'POST'])
+@app.route('/admin/quiz/edit/<index>', methods=['GET', 'POST'])
 @login_required
 def edit_quiz(index):
     """
@@ -496,24 +587,29 @@ def edit_quiz(index):
         flash('There is no quiz with such ID.')
         return redirect(url_for('add_quiz'))
 
-    form = QuizForm(name=edited_quiz.name,
-                    name_en=edited_quiz.name_en)
+    form = forms.QuizForm(name=edited_quiz.name,
+                          name_en=edited_quiz.name_en,
+                          counter_stripes=edited_quiz.counter_stripes)
 
     if form.validate_on_submit():
         edited_quiz.name = form.name.data
         edited_quiz.name_en = form.name_en.data
+        edited_quiz.counter_stripes = form.counter_stripes.data
+        content_changed('quiz')
         db.session.commit()
+        invalidate_quiz_schemas()
         flash('Your changes have been saved.')
         return redirect(url_for('add_quiz'))
     return render_template('quiz_edit.html',
                            form=form,
+                           bulk=bulk_context('quiz'),
                            menu=menu,
                            quiz=quizzes_to_display,
                            const=app.config['LANG_CONSTS'],
                            css_name='css/edit.css')
 
 
-@app.route('/admin/quiz/delete/<index>', Functions=['GET', 'POST'])
+@app.route('/admin/quiz/delete/<index>', methods=['GET', 'POST'])
 @login_required
 def delete_quiz(index):
     """
@@ -525,13 +621,108 @@ def delete_quiz(index):
     """
     quiz_to_delete = Quiz.query.filter_by(id=index).first()
     if quiz_to_delete is not None:
+        delete_votes(Quiz, [quiz_to_delete.id])
         db.session.delete(quiz_to_delete)
+        content_changed('quiz')
         db.session.commit()
+        invalidate_quiz_schemas()
     flash('You have successfully deleted a quiz item.')
     return redirect(url_for('add_quiz'))
 
 
-@app.route('/admin/quiz/question', Functions=['GET', 'POST'])
+@app.route('/admin/quiz/import', methods=['POST'])
+@login_required
+def import_quiz_file():
+    """
+    Function imports a whole Quiz (with questions and answer options) from uploaded JSON or CSV file
+    (see quiz_import.py). If the file is invalid - flashes errors found in it and nothing is imported.
+    :return: redirect to page with QuizForm
+    """
+    form = forms.QuizImportForm()
+    if form.validate_on_submit():
+        try:
+            quiz = read_quiz(form.file.data.stream, form.file.data.filename)
+        except QuizImportError as error:
+            for message in error.errors:
+                flash(message)
+        else:
+            import_quiz(quiz)
+            flash('You have successfully imported a quiz.')
+    else:
+        flash('Choose a .json or .csv file to import.')
+    return redirect(url_for('add_quiz'))
+
+
+@app.route('/admin/bulk/<entity>', methods=['POST'])
+@login_required
+def bulk_admin_action(entity):
+    """
+    Function runs bulk action (delete, move or set a field) on rows of admin table selected by checkboxes,
+    with set-based statements in one transaction (see bulk_admin.py).
+    If there's no such table or the action is invalid - flashes a message and nothing is changed.
+    :param entity: name of admin table (key of BULK_ENTITIES)
+    :return: redirect to admin page of the table
+    """
+    if entity not in BULK_ENTITIES:
+        flash('There is no such table.')
+        return redirect(url_for('index'))
+    form = forms.BulkActionForm()
+    if form.validate_on_submit():
+        try:
+            changed = bulk_action(entity, request.form.getlist('ids'), form.action.data,
+                                  target=form.target.data, field=form.field.data, value=form.value.data)
+        except ValueError as error:
+            flash(str(error))
+        else:
+            flash('You have successfully changed %d items.' % changed)
+    else:
+        flash('Invalid bulk action.')
+    return redirect(url_for(BULK_ENTITIES[entity]['view']))
+
+
+@app.route('/admin/quiz/analytics/<index>')
+@login_required
+def quiz_analytics(index):
+    """
+    Function prepares page with cross-tab analytics of Quiz which ID is specified in parameter.
+    Questions compared in rows and columns are chosen in query string (row, column - IDs of questions),
+    by default the first and the last question of the quiz.
+    If there's no Quiz with such ID, Function will flash message that there's no element with such ID.
+    :param index: ID of quiz
+    :return: HTML page
+    """
+    from . import analytics
+
+    analysed_quiz = Quiz.query.filter_by(id=index).first()
+    if analysed_quiz is None:
+        flash('There is no quiz with such ID.')
+        return redirect(url_for('add_quiz'))
+    menu = Menu.query.order_by(Menu.sequence).all()
+    responses = analytics.load_responses(analysed_quiz)
+    question_ids = [question.id for question in responses.questions]
+    table = conditional = chi_square = None
+    row_id = request.args.get('row', type=int, default=question_ids[0] if question_ids else None)
+    column_id = request.args.get('column', type=int, default=question_ids[-1] if question_ids else None)
+    if row_id in question_ids and column_id in question_ids:
+        table = responses.contingency(row_id, column_id)
+        conditional = analytics.conditional_distribution(table)
+        chi_square = analytics.chi_square(table)
+    return render_template('quiz_analytics.html',
+                           menu=menu,
+                           quiz=analysed_quiz,
+                           responses=responses,
+                           row=responses.options[question_ids.index(row_id)] if table is not None else [],
+                           column=responses.options[question_ids.index(column_id)] if table is not None else [],
+                           row_id=row_id,
+                           column_id=column_id,
+                           table=table,
+                           conditional=conditional,
+                           chi_square=chi_square,
+                           const=app.config['LANG_CONSTS'],
+                           css_name='css/edit.css')
+
+
+@app.route('/admin/quiz/question', methods=['GET', 'POST'])
 @login_required
 def add_quiz_question():
     """
@@ -540,7 +731,7 @@ def add_quiz_question():
     If not - page is prepared again, with pre-filled form and errors due to which validation didn't pass through. 
     :return: HTML page 
     """
-    form = QuizQuestionForm()
+    form = forms.QuizQuestionForm()
     menu = Menu.query.order_by(Menu.sequence).all()
     quiz_questions_to_display = QuizQuestion.query.all()
     if form.validate_on_submit():
@@ -548,18 +739,21 @@ def add_quiz_question():
                                      question_en=form.question_en.data,
                                      quiz=form.quiz.data)
         db.session.add(quiz_question)
+        content_changed('quiz')
         db.session.commit()
+        invalidate_quiz_schemas()
         flash('You have successfully added a quiz question element.')
         return redirect(url_for('add_quiz_question'))
     return render_template('quiz_question_edit.html',
                            form=form,
+                           bulk=bulk_context('quiz_question'),
                            menu=menu,
                            quiz_question=quiz_questions_to_display,
                            const=app.config['LANG_CONSTS'],
                            css_name='css/edit.css')
 
 
-@app.route('/admin/quiz/question/edit/<index>', Functions=['GET', 'POST'])
+@app.route('/admin/quiz/question/edit/<index>', methods=['GET', 'POST'])
 @login_required
 def edit_quiz_question(index):
     """
@@ -578,26 +772,29 @@ def edit_quiz_question(index):
         flash('There is no quiz question with such ID.')
         return redirect(url_for('add_quiz_question'))
 
-    form = QuizQuestionForm(question=edited_quiz_question.question,
-                            question_en=edited_quiz_question.question_en,
-                            quiz=edited_quiz_question.quiz)
+    form = forms.QuizQuestionForm(question=edited_quiz_question.question,
+                                  question_en=edited_quiz_question.question_en,
+                                  quiz=edited_quiz_question.quiz)
 
     if form.validate_on_submit():
         edited_quiz_question.question = form.question.data
         edited_quiz_question.question_en = form.question_en.data
         edited_quiz_question.quiz = form.quiz.data
+        content_changed('quiz')
         db.session.commit()
+        invalidate_quiz_schemas()
         flash('Your changes have been saved.')
         return redirect(url_for('add_quiz_question'))
     return render_template('quiz_question_edit.html',
                            form=form,
+                           bulk=bulk_context('quiz_question'),
                            menu=menu,
                            quiz_question=quiz_questions_to_display,
                            const=app.config['LANG_CONSTS'],
                            css_name='css/edit.css')
 
 
-@app.route('/admin/quiz/question/delete/<index>', Functions=['GET', 'POST'])
+@app.route('/admin/quiz/question/delete/<index>', methods=['GET', 'POST'])
 @login_required
 def delete_quiz_question(index):
     """
@@ -609,13 +806,16 @@ def delete_quiz_question(index):
     """
     quiz_question_to_delete = QuizQuestion.query.filter_by(id=index).first()
     if quiz_question_to_delete is not None:
+        delete_votes(QuizQuestion, [quiz_question_to_delete.id])
         db.session.delete(quiz_question_to_delete)
+        content_changed('quiz')
         db.session.commit()
+        invalidate_quiz_schemas()
     flash('You have successfully deleted a quiz question item.')
     return redirect(url_for('add_quiz_question'))
 
 
-@app.route('/admin/quiz/answer', Functions=['GET', 'POST'])
+@app.route('/admin/quiz/answer', methods=['GET', 'POST'])
 @login_required
 def add_quiz_answer_option():
     """
@@ -624,7 +824,7 @@ def add_quiz_answer_option():
     If not - page is prepared again, with pre-filled form and errors due to which validation didn't pass through. 
     :return: HTML page 
     """
-    form = QuizAnswerOptionForm()
+    form = forms.QuizAnswerOptionForm()
     menu = Menu.query.order_by(Menu.sequence).all()
     quiz_answer_options_to_display = QuizAnswerOption.query.all()
     if form.validate_on_submit():
@@ -632,18 +832,21 @@ def add_quiz_answer_option():
                                               answer_en=form.answer_en.data,
                                               quiz_question=form.quiz_question.data)
         db.session.add(quiz_answer_option)
+        content_changed('quiz')
         db.session.commit()
+        invalidate_quiz_schemas()
         flash('You have successfully added a quiz answer option element.')
         return redirect(url_for('add_quiz_answer_option'))
     return render_template('quiz_answer_option_edit.html',
                            form=form,
+                           bulk=bulk_context('quiz_answer_option'),
                            menu=menu,
                            quiz_answer_option=quiz_answer_options_to_display,
                            const=app.config['LANG_CONSTS'],
                            css_name='css/edit.css')
 
 
-@app.route('/admin/quiz/answer/edit/<index>', Functions=['GET', 'POST'])
+@app.route('/admin/quiz/answer/edit/<index>', methods=['GET', 'POST'])
 @login_required
 def edit_quiz_answer_option(index):
     """
@@ -662,26 +865,29 @@ def edit_quiz_answer_option(index):
         flash('There is no quiz answer option with such ID.')
         return redirect(url_for('add_quiz_answer_option'))
 
-    form = QuizAnswerOptionForm(answer=edited_quiz_answer_option.answer,
-                                answer_en=edited_quiz_answer_option.answer_en,
-                                quiz_question=edited_quiz_answer_option.quiz_question)
+    form = forms.QuizAnswerOptionForm(answer=edited_quiz_answer_option.answer,
+                                      answer_en=edited_quiz_answer_option.answer_en,
+                                      quiz_question=edited_quiz_answer_option.quiz_question)
 
     if form.validate_on_submit():
         edited_quiz_answer_option.answer = form.answer.data
         edited_quiz_answer_option.answer_en = form.answer_en.data
         edited_quiz_answer_option.quiz_question = form.quiz_question.data
+        content_changed('quiz')
         db.session.commit()
+        invalidate_quiz_schemas()
         flash('Your changes have been saved.')
         return redirect(url_for('add_quiz_answer_option'))
     return render_template('quiz_answer_option_edit.html',
                            form=form,
+                           bulk=bulk_context('quiz_answer_option'),
                            menu=menu,
                            quiz_answer_option=quiz_answer_options_to_display,
                            const=app.config['LANG_CONSTS'],
                            css_name='css/edit.css')
 
 
-@app.route('/admin/quiz/answer/delete/<index>', Functions=['GET', 'POST'])
+@app.route('/admin/quiz/answer/delete/<index>', methods=['GET', 'POST'])
 @login_required
 def delete_quiz_answer_option(index):
     """
@@ -693,66 +899,249 @@ def delete_quiz_answer_option(index):
     """
     quiz_answer_option_to_delete = QuizAnswerOption.query.filter_by(id=index).first()
     if quiz_answer_option_to_delete is not None:
+        delete_votes(QuizAnswerOption, [quiz_answer_option_to_delete.id])
         db.session.delete(quiz_answer_option_to_delete)
+        content_changed('quiz')
         db.session.commit()
+        invalidate_quiz_schemas()
     flash('You have successfully deleted a quiz answer option item.')
     return redirect(url_for('add_quiz_answer_option'))
 
 
-@app.route('/quiz/<name>', Functions=['GET', 'POST'])
+@app.route('/quiz/<name>', methods=['GET', 'POST'])
 def quiz(name):
     """
     Function prepares Quiz with ID (or Quiz.name if there's no Quiz with such ID) specified in parameter.
-    If form is filled - redirects to page with results of Quiz presented as a Chart.
+    If form is filled - checks it against cached QuizSchema before touching the database. Only complete submission
+    with valid answers is saved, then page with results of Quiz presented as a Chart is returned.
+    Submissions are limited per IP address (429 Too Many Requests) and every browser (identified by a signed cookie
+    given with the quiz form) can fill a quiz only once. If too many submissions are being saved at once, the submission
+    is refused with 503 Service Unavailable (see admission.py). If VOTE_LOG_ENABLED, submission is only appended
+    to the vote log and saved in the database later by vote_ingest.py (see votelog.py).
     :param name: Quiz name or ID
     :return: HTML page
     """
-    menu = Menu.query.order_by(Menu.sequence).all()
-
+    voter = quiz_voter()
+    if request.method == 'POST':
+        allowed, retry_after = quiz_rate_limiter.allow(request.remote_addr)
+        if not allowed:
+            return 'Too many submissions, try again later.', 429, {'Retry-After': str(int(retry_after) + 1)}
+        schema = quiz_schema(name)
+        if schema is None:
+            return render_template('404.html',
+                                   const=app.config['LANG_CONSTS']), 404
+        options = schema.validate(request.form)
+        if voter is None:
+            flash('Your browser has to accept cookies to fill the quiz.')
+        elif options is None:
+            flash('You should fill all the answers!')
+        elif '%d:%s' % (schema.quiz_id, voter) in quiz_voters:
+            flash('You have already filled this quiz.')
+        else:
+            # Results are taken before the vote is saved, so the vote can be added to them exactly once.
+            counts = quiz_tallies(schema.quiz_id)
+            created_at = datetime.datetime.utcnow()
+            if app.config['VOTE_LOG_ENABLED']:
+                vote_log.append(schema.quiz_id, created_at, options)
+            else:
+                if not write_gate.acquire():
+                    return 'Too many submissions at the moment, try again later.', 503, \
+                           {'Retry-After': str(app.config['DB_WRITE_RETRY_AFTER'])}
+                try:
+                    db.session.add(QuizSubmission(quiz=Quiz.query.get(schema.quiz_id),
+                                                  options=options,
+                                                  created_at=created_at))
+                    QuizVoteBucket.add_votes(schema.quiz_id, created_at, Counter(options), schema.stripes)
+                    db.session.commit()
+                finally:
+                    write_gate.release()
+            # Voter is remembered only once the vote is saved - a refused or failed submission may be repeated.
+            quiz_voters.add('%d:%s' % (schema.quiz_id, voter))
+
+            quiz = Quiz.query.get(schema.quiz_id)
+            chosen = dict((answer.id, answer) for answer in
+                          QuizAnswerOption.query.filter(QuizAnswerOption.id.in_(options)))
+            answers = [chosen[option_id] for option_id in options]
+            counts.update(options)
+            answer_data = []
+            for question in quiz.questions:
+                answer_data.append([counts[answer.id] for answer in question.answers])
+            return render_template('chart.html',
+                                   quiz=quiz,
+                                   answers=answers,
+                                   answer_data=answer_data,
+                                   css_name='css/chart.css',
+                                   const=app.config['LANG_CONSTS'])
+
+    menu = navigation()
     quiz = Quiz.query.filter_by(name=name).first()
     if quiz is None:
         quiz = Quiz.query.filter_by(id=name).first()
         if quiz is None:
             return render_template('404.html',
                                    const=app.config['LANG_CONSTS']), 404
+    response = make_response(render_template('quiz.html',
+                                             quiz=quiz,
+                                             css_name='css/poll.css',
+                                             const=app.config['LANG_CONSTS'],
+                                             menu=menu))
+    if voter is None:
+        response.set_cookie(app.config['QUIZ_VOTER_COOKIE'], voter_signer.sign(uuid.uuid4().hex).decode('ascii'),
+                            max_age=app.config['QUIZ_DUPLICATE_FILTER_ROTATION'], httponly=True)
+    return response
+
+
+def quiz_voter():
+    """
+    Function returns identifier of the browser from its signed quiz voter cookie.
+    :return: string, None if there's no cookie or its signature is invalid
+    """
+    cookie = request.cookies.get(app.config['QUIZ_VOTER_COOKIE'])
+    if cookie is None:
+        return None
     try:
-        if request.Function == 'POST' and request.form is not None:
-            answers = []
-            answer_data = []
+        return voter_signer.unsign(cookie).decode('ascii')
+    except BadSignature:
+        return None
 
-            for quiz_question_id in request.form:
-                user_answer = QuizUserAnswer(quiz_question_id=quiz_question_id,
-                                             quiz_answer_option_id=request.form[quiz_question_id])
-                answers.append(user_answer)
-                db.session.add(user_answer)
-                db.session.commit()
 
-            for question in quiz.questions:
-                tmp = []
-                for answer in question.answers:
-                    tmp.append(QuizUserAnswer.query.filter_by(quiz_answer_option=answer).count())
-                answer_data.append(tmp)
-
-            if answer_data is not None and answers is not None:
-                return render_template('chart.html',
-                                       quiz=quiz,
-                                       answers=answers,
-                                       answer_data=answer_data,
-                                       css_name='css/chart.css',
-                                       const=app.config['LANG_CONSTS'])
-
-    except:
-        flash('You should fill all the answers!')
-    return render_template('quiz.html',
-                           quiz=quiz,
-                           css_name='css/poll.css',
-                           const=app.config['LANG_CONSTS'],
-                           menu=menu)
+def parse_moment(value, default):
+    """
+    Function parses date given in query string (e.g. 2017-05-10 or 2017-05-10T14:00).
+    :param value: string or None
+    :param default: datetime returned if value is empty
+    :return: datetime
+    """
+    if not value:
+        return default
+    for date_format in ('%Y-%m-%dT%H:%M', '%Y-%m-%d'):
+        try:
+            return datetime.datetime.strptime(value, date_format)
+        except ValueError:
+            pass
+    return default
+
+
+@app.route('/quiz/<name>/trend')
+def quiz_trend(name):
+    """
+    Function returns votes of Quiz with name (or ID) specified in parameter as a time series in JSON.
+    Query string may contain:
+        - period - 'hour' (default) or 'day'
+        - start, end - range of the series, by default the last 7 days
+    Only QuizVoteBucket rollups are read, never the submissions.
+    :param name: Quiz name or ID
+    :return: JSON
+    """
+    quiz = Quiz.query.filter_by(name=name).first()
+    if quiz is None:
+        quiz = Quiz.query.filter_by(id=name).first()
+        if quiz is None:
+            return jsonify(error='There is no quiz with such name or ID.'), 404
+    period = request.args.get('period', 'hour')
+    if period not in QuizVoteBucket.PERIODS:
+        return jsonify(error='Period should be one of: %s.' % ', '.join(QuizVoteBucket.PERIODS)), 400
+    end = parse_moment(request.args.get('end'), datetime.datetime.utcnow())
+    start = parse_moment(request.args.get('start'), end - datetime.timedelta(days=7))
+    series = QuizVoteBucket.series(quiz.id, start, end, period)
+    return jsonify(quiz=quiz.id,
+                   period=period,
+                   series=[{'start': bucket.isoformat(),
+                            'votes': dict((str(option_id), votes) for option_id, votes in votes.items())}
+                           for bucket, votes in series])
+
+
+@app.route('/metrics')
+def metrics():
+    """
+    Function returns metrics of an application in Prometheus text format, only to requests with METRICS_TOKEN.
+    :return: plain text
+    """
+    token = app.config['METRICS_TOKEN']
+    if not token:
+        return 'Not Found', 404
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), 'Bearer ' + token):
+        return 'Unauthorized', 401, {'WWW-Authenticate': 'Bearer'}
+    return '\n'.join(write_gate.metrics()) + '\n', 200, {'Content-Type': 'text/plain; version=0.0.4'}
+
+
+def navigation():
+    """
+    Function returns cached navigation of the website (see Menu.navigation()).
+    :return: list of dicts
+    """
+    return get_or_set('navigation:menu', load_from_primary(Menu.navigation),
+                      app.config['CACHE_TIMEOUT'], app.config['CACHE_STALE'])
+
+
+def cached_page(index, by_id=True):
+    """
+    Function returns cached data of Page with link (or ID if link is not found) specified in parameter.
+    :param index: link or ID of page
+    :param by_id: if False, page is looked up only by link
+    :return: dict with fields of Page or None if there's no such page
+    """
+    def load():
+        page = Page.query.filter_by(link=index).first()
+        if page is None and by_id:
+            page = Page.query.filter_by(id=index).first()
+        if page is None:
+            return None
+        return dict((column.name, getattr(page, column.name)) for column in Page.__table__.columns)
+
+    return get_or_set('page:%s:%s' % (by_id, index), load_from_primary(load),
+                      app.config['CACHE_TIMEOUT'], app.config['CACHE_STALE'])
+
+
+def render_cached(key, template, **context):
+    """
+    Function renders template. HTML rendered for anonymous users is cached per language under key,
+    which has to identify all the content of the page (navigation is common for all pages).
+    :param key: string
+    :param template: name of template
+    :param context: variables of template
+    :return: HTML page
+    """
+    if g.user.is_authenticated:
+        return render_template(template, **context)
+    return get_or_set('page_html:%s:%s' % (session['lang'], key),
+                      load_from_primary(lambda: render_template(template, **context)),
+                      app.config['CACHE_TIMEOUT'],
+                      app.config['CACHE_STALE'])
+
+
+def quiz_tallies(quiz_id):
+    """
+    Function returns cached results of Quiz with ID specified in parameter (see QuizSubmission.option_counts()).
+    Results are computed again at most every QUIZ_TALLY_CACHE_TIMEOUT seconds.
+    :param quiz_id: ID of quiz
+    :return: Counter {QuizAnswerOption.id: count}
+    """
+    return Counter(get_or_set('quiz_tally:%d' % quiz_id,
+                              lambda: dict(QuizSubmission.option_counts(quiz_id)),
+                              app.config['QUIZ_TALLY_CACHE_TIMEOUT'],
+                              app.config['QUIZ_TALLY_CACHE_STALE']))
 
 
 @lm.user_loader
 def load_user(id):
-    return User.query.get(int(id))
+    """
+    Function loads user of the session. It's called only when current_user (g.user) is used in a request.
+    User's fields are cached for USER_CACHE_TIMEOUT seconds, then the user is attached to the database session
+    without a query (so it can be still edited and saved).
+    :param id: ID of user
+    :return: User or None
+    """
+    def load():
+        user_ = User.query.get(int(id))
+        return user_.record() if user_ is not None else None
+
+    record = get_or_set('user:%s' % id, load_from_primary(load), app.config['USER_CACHE_TIMEOUT'])
+    if record is None:
+        return None
+    user_ = User(**record)
+    make_transient_to_detached(user_)
+    return db.session.merge(user_, load=False)
 
 
 @app.errorhandler(404)
@@ -0,0 +1,4 @@
+#!flask/bin/python
+from app.votelog import ingest_forever
+
+ingest_forever()
@@ -0,0 +1,319 @@
+import atexit
+import datetime
+import glob
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import Counter
+from app import app, db
+from .models import QuizSubmission, QuizVoteBucket, VoteLogCheckpoint
+
+"""
+Contains append-only log of quiz submissions.
+Instead of a database transaction, accepting a vote costs one sequential append to a segment file of the current
+process. Segments are flushed to disk (fsync) in batches by a background thread. Separate ingestion process
+(vote_ingest.py) reads the segments and saves the votes in large transactions - position reached in every segment
+is saved in the same transaction as the votes (VoteLogCheckpoint), so after a crash nothing is lost or counted twice.
+Segment of a process is sealed at its exit, segment left open by a process that died is sealed by the ingestion
+(VOTE_LOG_DIR has to be local to the host, processes are recognised by their PIDs). Corrupted records of sealed
+segments are skipped (and logged), so they don't stop ingestion of the rest.
+
+Segment files (in VOTE_LOG_DIR):
+    - <created>-<pid>.open - segment which is still being written
+    - <created>-<pid>.log - sealed segment, nothing will be appended to it
+Record: length and CRC32 of the payload (2 x uint32), then payload: quiz ID (uint32), time of submission
+(microseconds since epoch, int64) and IDs of chosen options (uint32 each), all little endian.
+"""
+
+HEADER = struct.Struct('<II')
+PAYLOAD = struct.Struct('<Iq')
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def encode(quiz_id, created_at, options):
+    """
+    Function encodes submission as a log record.
+    :param quiz_id: ID of quiz
+    :param created_at: datetime
+    :param options: list of IDs of chosen answer options
+    :return: bytes
+    """
+    microseconds = (created_at - EPOCH) // datetime.timedelta(microseconds=1)
+    payload = PAYLOAD.pack(quiz_id, microseconds) + QuizSubmission.pack_options(options)
+    return HEADER.pack(len(payload), zlib.crc32(payload) & 0xffffffff) + payload
+
+
+def valid_length(length):
+    """
+    Function checks if length from header of a record can be a length of a payload.
+    :param length: integer
+    :return: boolean
+    """
+    return length >= PAYLOAD.size and (length - PAYLOAD.size) % 4 == 0
+
+
+def valid_record(length, checksum, payload):
+    """
+    Function checks if record read from a segment is complete and not corrupted.
+    :param length: length from header of the record
+    :param checksum: CRC32 from header of the record
+    :param payload: bytes read after the header (at most length)
+    :return: boolean
+    """
+    return valid_length(length) and len(payload) == length and zlib.crc32(payload) & 0xffffffff == checksum
+
+
+def next_record(data):
+    """
+    Function finds the first valid record in data (after its first byte, which starts a corrupted record).
+    Headers are checked first, so only payloads which fit into data are checksummed (without copying).
+    :param data: bytes of a segment after the start of a corrupted record
+    :return: position of the record in data, length of data if there's none
+    """
+    view = memoryview(data)
+    for position in range(1, len(data) - HEADER.size + 1):
+        length, checksum = HEADER.unpack_from(data, position)
+        start = position + HEADER.size
+        if valid_length(length) and start + length <= len(data) and \
+                zlib.crc32(view[start:start + length]) & 0xffffffff == checksum:
+            return position
+    return len(data)
+
+
+def read_records(path, offset, limit, sealed=False):
+    """
+    Function reads complete records of a segment starting at offset.
+    Reading stops at the end of file, at a torn (incomplete or corrupted) record of a segment which is still being
+    written, or after limit records. In a sealed segment, corrupted data is skipped up to the next valid record.
+    :param path: path of segment file
+    :param offset: position in file
+    :param limit: maximal amount of records
+    :param sealed: nothing is appended to the segment anymore
+    :return: tuple (list of tuples (quiz ID, datetime, options), offset after the last record)
+    """
+    records = []
+    with open(path, 'rb') as segment:
+        segment.seek(offset)
+        while len(records) < limit:
+            header = segment.read(HEADER.size)
+            if not header:
+                break
+            length, checksum = HEADER.unpack(header) if len(header) == HEADER.size else (0, 0)
+            payload = segment.read(length) if valid_length(length) else b''
+            if not valid_record(length, checksum, payload):
+                if not sealed:
+                    break
+                segment.seek(offset)
+                skipped = next_record(segment.read())
+                app.logger.warning('Vote log: skipped %d bytes of corrupted records at offset %d of %s',
+                                   skipped, offset, path)
+                offset += skipped
+                segment.seek(offset)
+                continue
+            quiz_id, microseconds = PAYLOAD.unpack_from(payload)
+            records.append((quiz_id,
+                            EPOCH + datetime.timedelta(microseconds=microseconds),
+                            QuizSubmission.unpack_options(payload[PAYLOAD.size:])))
+            offset += HEADER.size + length
+    return records, offset
+
+
+class VoteLog(object):
+    """
+    Class representing writer of the vote log of the current process.
+    Records are appended with single write() calls. Background thread calls fsync every `fsync_interval` seconds
+    if anything was written - appenders with sync=True wait for the fsync covering their record (group commit),
+    so one fsync makes durable all votes accepted in the meantime.
+    Segment is sealed and a new one is started when it's bigger than `segment_size` bytes.
+    """
+
+    def __init__(self, directory, segment_size, fsync_interval):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._synced = threading.Condition(self._lock)
+        self._file = None
+        self._path = None
+        self._written = 0
+        self._appended = 0
+        self._durable = 0
+        self._flusher = None
+        atexit.register(self.close)
+
+    def _open_segment(self):
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        self._path = os.path.join(self.directory, '%d-%d.open' % (int(time.time() * 1000000), os.getpid()))
+        self._file = os.open(self._path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._written = 0
+
+    def _seal_segment(self):
+        os.fsync(self._file)
+        os.close(self._file)
+        os.rename(self._path, self._path[:-len('.open')] + '.log')
+        self._file = None
+        self._durable = self._appended
+
+    def append(self, quiz_id, created_at, options, sync=True):
+        """
+        Method appends submission to the log.
+        :param quiz_id: ID of quiz
+        :param created_at: datetime
+        :param options: list of IDs of chosen answer options
+        :param sync: wait until the record is on disk
+        """
+        record = encode(quiz_id, created_at, options)
+        with self._lock:
+            if self._flusher is None or self._flusher[1] != os.getpid():
+                # First append in this process (also after fork of a worker).
+                self._file = None
+                self._flusher = (threading.Thread(target=self._flush_forever), os.getpid())
+                self._flusher[0].daemon = True
+                self._flusher[0].start()
+            if self._file is None:
+                self._open_segment()
+            os.write(self._file, record)
+            self._written += len(record)
+            self._appended += 1
+            sequence = self._appended
+            if self._written >= self.segment_size:
+                self._seal_segment()
+                self._synced.notify_all()
+            while sync and self._durable < sequence:
+                self._synced.wait()
+
+    def _flush_forever(self):
+        while True:
+            time.sleep(self.fsync_interval)
+            with self._lock:
+                if self._file is None or self._durable == self._appended:
+                    continue
+                appended = self._appended
+                descriptor = self._file
+            try:
+                os.fsync(descriptor)
+            except OSError:
+                # Segment was sealed meanwhile - sealing has already made it durable.
+                continue
+            with self._lock:
+                self._durable = max(self._durable, appended)
+                self._synced.notify_all()
+
+    def close(self):
+        """
+        Method seals current segment of this process (called at its exit).
+        """
+        with self._lock:
+            # Forked worker may have inherited the segment of its parent, which it must not seal.
+            if self._file is not None and self._flusher[1] == os.getpid():
+                self._seal_segment()
+                self._synced.notify_all()
+
+
+def apply_records(records):
+    """
+    Function saves records of the log as QuizSubmissions and adds them to QuizVoteBucket rollups.
+    Submissions are inserted with one executemany, rollups with one add_votes() call per quiz and hour.
+    It doesn't commit - it's a part of the caller's transaction.
+    :param records: list of tuples (quiz ID, datetime, options)
+    """
+    db.session.execute(QuizSubmission.__table__.insert(),
+                       [{'quiz_id': quiz_id,
+                         'created_at': created_at,
+                         'option_ids': QuizSubmission.pack_options(options)} for quiz_id, created_at, options in records])
+    buckets = {}
+    for quiz_id, created_at, options in records:
+        hour = QuizVoteBucket.bucket_start(created_at, 'hour')
+        buckets.setdefault((quiz_id, hour), Counter()).update(options)
+    for (quiz_id, hour), counts in buckets.items():
+        QuizVoteBucket.add_votes(quiz_id, hour, counts)
+
+
+def process_alive(pid):
+    """
+    Function checks if process with given PID is running.
+    :param pid: integer
+    :return: boolean
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def seal_abandoned_segments(directory):
+    """
+    Function seals open segments of processes which are not running anymore (e.g. killed workers).
+    :param directory: path of the log
+    """
+    for path in glob.glob(os.path.join(directory, '*.open')):
+        pid = int(os.path.splitext(os.path.basename(path))[0].split('-')[1])
+        if not process_alive(pid):
+            try:
+                os.rename(path, path[:-len('.open')] + '.log')
+            except OSError:
+                pass
+
+
+def ingest_segments(directory=None, batch_size=None):
+    """
+    Function saves everything that was appended to the log since the last call.
+    Every batch (at most batch_size records of one segment) is saved in one transaction together with
+    the new position in the segment. Segments of processes which died are sealed, sealed segments that were read
+    completely are deleted.
+    :param directory: path of the log, VOTE_LOG_DIR by default
+    :param batch_size: integer, VOTE_LOG_BATCH_SIZE by default
+    :return: amount of ingested records
+    """
+    directory = directory or app.config['VOTE_LOG_DIR']
+    batch_size = batch_size or app.config['VOTE_LOG_BATCH_SIZE']
+    ingested = 0
+    # Checkpoints decide what is saved next - reading them from a lagging replica would count votes twice.
+    db.session.use_primary()
+    seal_abandoned_segments(directory)
+    paths = glob.glob(os.path.join(directory, '*.log')) + glob.glob(os.path.join(directory, '*.open'))
+    for path in sorted(paths, key=lambda path: int(os.path.basename(path).split('-')[0])):
+        segment = os.path.splitext(os.path.basename(path))[0]
+        checkpoint = VoteLogCheckpoint.query.get(segment) or VoteLogCheckpoint(segment=segment, offset=0)
+        while True:
+            try:
+                records, offset = read_records(path, checkpoint.offset, batch_size, path.endswith('.log'))
+            except (IOError, OSError):
+                # Segment was sealed (renamed) meanwhile, it will be read under its new name.
+                break
+            if offset == checkpoint.offset:
+                break
+            if records:
+                apply_records(records)
+            checkpoint.offset = offset
+            db.session.add(checkpoint)
+            db.session.commit()
+            ingested += len(records)
+        if path.endswith('.log') and os.path.exists(path) and checkpoint.offset >= os.path.getsize(path):
+            os.remove(path)
+            if checkpoint in db.session:
+                db.session.delete(checkpoint)
+                db.session.commit()
+    db.session.remove()
+    return ingested
+
+
+def ingest_forever(directory=None, batch_size=None, idle_interval=None):
+    """
+    Function tails the log - ingests new records, waits idle_interval seconds when there was nothing new.
+    """
+    idle_interval = idle_interval or app.config['VOTE_LOG_IDLE_INTERVAL']
+    while True:
+        if not ingest_segments(directory, batch_size):
+            time.sleep(idle_interval)
+
+
+vote_log = VoteLog(app.config['VOTE_LOG_DIR'],
+                   app.config['VOTE_LOG_SEGMENT_SIZE'],
+                   app.config['VOTE_LOG_FSYNC_INTERVAL'])
@@ -0,0 +1,97 @@
+import atexit
+import os
+import pickle
+import tempfile
+import time
+from app import app, db
+from .cache import cache
+from .content_version import NAMESPACES, mark_seen, seen_versions
+from .models import ContentVersion, Page, Quiz
+from .quiz_schema import quiz_schema
+from .views import navigation, cached_page, quiz_tallies
+
+"""
+Contains warm-up of the cache before a worker gets its first request (called by wsgi.py), so a restart doesn't send
+all traffic to the database at once:
+    - snapshot of the cache written at shutdown (CACHE_SNAPSHOT) is loaded, without content changed since then
+      (checked against ContentVersion)
+    - the hot working set still missing is loaded from the database: navigation, pages, quiz schemas and results
+Cache shared in a file (CACHE_BACKEND 'shared') outlives the processes by itself - the snapshot keeps only versions
+of its content.
+"""
+
+# Namespaces saved in snapshot - results of quizzes change without version, they're always loaded again
+SNAPSHOT_NAMESPACES = ('navigation', 'page', 'page_html', 'fragment', 'quiz_schema')
+
+
+def save_snapshot(path):
+    """
+    Function writes cached content with versions it was cached at to a file (replaced at once).
+    Does nothing if the process hasn't checked versions of content yet.
+    :param path: path of snapshot file
+    """
+    versions = seen_versions()
+    if not versions:
+        return
+    entries = [] if cache.persistent else cache.items(SNAPSHOT_NAMESPACES)
+    fd, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump({'versions': versions, 'entries': entries}, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, path)
+    except Exception:
+        os.unlink(temporary)
+        raise
+
+
+def load_snapshot(path, versions):
+    """
+    Function puts content from snapshot file to the cache, except namespaces of content types which version differs
+    from the current one (they're dropped from the shared cache as well).
+    :param path: path of snapshot file, None means there's no snapshot (all content is dropped)
+    :param versions: current versions of content types
+    :return: amount of restored entries
+    """
+    snapshot = {'versions': {}, 'entries': []}
+    if path is not None:
+        try:
+            with open(path, 'rb') as f:
+                snapshot = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            pass
+    changed = set(namespace for content_type, namespaces in NAMESPACES.items()
+                  if snapshot['versions'].get(content_type) != versions.get(content_type)
+                  for namespace in namespaces)
+    if cache.persistent:
+        for namespace in changed:
+            cache.delete_namespace(namespace)
+        return 0
+    now = time.time()
+    restored = 0
+    for key, value, expires in snapshot['entries']:
+        if key.split(':', 1)[0] not in changed and (expires is None or expires > now):
+            cache.set(key, value, expires - now if expires is not None else None)
+            restored += 1
+    return restored
+
+
+def warm_up_cache():
+    """
+    Function fills the cache (from snapshot, then from the database) and registers saving of the snapshot
+    at shutdown of the process.
+    """
+    with app.app_context():
+        # Versions are read before the content, so content changed meanwhile is dropped by the next check.
+        versions = ContentVersion.versions()
+        load_snapshot(app.config['CACHE_SNAPSHOT'], versions)
+        mark_seen(versions)
+        navigation()
+        cached_page('index', by_id=False)
+        for link, in db.session.query(Page.link).filter(Page.link.isnot(None)):
+            cached_page(link)
+        for quiz_id, name in db.session.query(Quiz.id, Quiz.name):
+            quiz_schema(name)
+            quiz_tallies(quiz_id)
+        db.session.remove()
+    if app.config['CACHE_SNAPSHOT']:
+        atexit.register(save_snapshot, app.config['CACHE_SNAPSHOT'])
@@ -0,0 +1,17 @@
+from app import app
+
+"""
+Contains WSGI entry point of the application for servers, e.g.:
+    gunicorn app.wsgi:application
+Worker is warmed up here (not on import of the application, so scripts and tests don't pay for it) before it gets
+its first request. Without --preload every worker of the server warms itself up.
+"""
+
+if app.config['CACHE_WARMUP']:
+    from app.warmup import warm_up_cache
+    warm_up_cache()
+if app.config['TEMPLATE_WARMUP']:
+    from app.templating import warm_up
+    warm_up(app, app.config['TEMPLATE_WARMUP_PATHS'])
+
+application = app